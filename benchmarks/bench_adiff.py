@@ -0,0 +1,104 @@
+import time
+import tracemalloc
+import numpy as np
+from bench_mechanism import (
+    get_solution, get_states, get_subset, run_cantera
+)
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np
+
+
+class RecursiveWalker:
+    # The previous walker: recurses along every path from the output,
+    # calling grad_fn once per visit
+    def compute_gradient(self, ary):
+        self.gradients = {}
+        self.rec(ary, np.ones_like(ary.values))
+        return self.gradients
+
+    def rec(self, ary, prec_grad):
+        if isinstance(ary, adiff_np.AutodiffVariable):
+            if ary.name in self.gradients:
+                self.gradients[ary.name] = self.gradients[ary.name] + prec_grad
+            else:
+                self.gradients[ary.name] = prec_grad
+            return
+        for c, g in zip(ary.children, ary.grad_fn(prec_grad)):
+            if isinstance(c, adiff_np.AutodiffArray):
+                self.rec(c, g)
+
+
+def measure(fn):
+    # Wall time and peak traced allocation of a single call
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def count_grad_fn_calls(ary, walker):
+    # Wraps grad_fn on every node of the graph with a counter
+    calls = [0]
+    stack, seen = [ary], set()
+    while stack:
+        node = stack.pop()
+        if node in seen or isinstance(node, adiff_np.AutodiffVariable):
+            continue
+        seen.add(node)
+
+        def counted(grad, fn=node.grad_fn):
+            calls[0] += 1
+            return fn(grad)
+        node.grad_fn = counted
+        stack.extend(
+            c for c in node.children if isinstance(c, adiff_np.AutodiffArray)
+        )
+    walker.compute_gradient(ary)
+    return len(seen), calls[0]
+
+
+def run_minipyro():
+
+    sol = get_subset(get_solution('gri30.yaml'), 100)
+    pyro_gas = get_thermochem_class(sol)(adiff_np)
+
+    print('{:>8s} {:>6s} {:>12s} {:>12s} {:>8s} {:>8s} {:>9s} {:>10s} '
+          '{:>9s}'.format(
+              'num_x', 'nodes', 'calls (rec)', 'calls (tape)', 'rec [s]',
+              'tape [s]', 'rec [MiB]', 'tape [MiB]', 'max diff'
+          ))
+    for num_x in [10**2, 10**3, 10**4]:
+        temp, mass_fracs = get_states(sol, num_x)
+        conc, _ = run_cantera(sol, temp, mass_fracs)
+
+        def build():
+            return pyro_gas.get_rxn_rate(
+                adiff_np.AutodiffVariable(temp, name='temperature'),
+                adiff_np.AutodiffVariable(conc, name='concentration')
+            )
+
+        nodes, calls_rec = count_grad_fn_calls(build(), RecursiveWalker())
+        _, calls_tape = count_grad_fn_calls(build(), adiff_np.AutodiffWalker())
+
+        rxn_rate = build()
+        g_rec, t_rec, mem_rec = measure(
+            lambda: RecursiveWalker().compute_gradient(rxn_rate)
+        )
+        g_tape, t_tape, mem_tape = measure(rxn_rate.gradient)
+
+        diff = max(
+            np.max(np.abs(g_tape[n] - g_rec[n]) / (np.abs(g_rec[n]) + 1e-300))
+            for n in g_rec
+        )
+        print(f'{num_x:>8d} {nodes:>6d} {calls_rec:>12d} {calls_tape:>12d} '
+              f'{t_rec:>8.3f} {t_tape:>8.3f} {mem_rec/2**20:>9.1f} '
+              f'{mem_tape/2**20:>10.1f} {diff:>9.1e}')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,70 @@
+import sys
+import time
+import numpy as np
+from bench_mechanism import (
+    best_of, get_solution, get_states, run_cantera
+)
+from minipyro.codegen import c, python
+
+
+# Largest relative error accepted against the NumPy class. Both evaluate
+# the same expressions; the C compiler may contract or reorder a few.
+TOLERANCE = 1e-12
+
+
+def run_minipyro():
+
+    failed = []
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        sol = get_solution(mech)
+        pyro_np = python.get_thermochem_class(sol)()
+        t0 = time.perf_counter()
+        pyro_c = c.get_thermochem_class(sol)()
+        t_gen = time.perf_counter() - t0
+        print(f'{mech}: {sol.n_reactions} reactions, '
+              f'C generation and compilation (or cache hit): {t_gen:.3f} s')
+
+        temp_0, mass_fracs_0 = get_states(sol, 1000)
+        conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+
+        print('{:>10s} {:>14s} {:>14s} {:>9s} {:>10s}'.format(
+            'num_x', 'numpy [pts/s]', 'C [pts/s]', 'speedup', 'max rel err'
+        ))
+        for num_x in [10**3, 10**4, 10**5]:
+            reps = num_x // 1000
+            temp = np.tile(temp_0, reps)
+            conc = np.tile(conc_0, reps)
+            out = np.empty((sol.n_reactions, num_x))
+
+            t_np = best_of(lambda: pyro_np.get_rxn_rate(temp, conc))
+            t_c = best_of(lambda: pyro_c.get_rxn_rate(temp, conc, out=out))
+            ref = pyro_np.get_rxn_rate(temp, conc)
+            err = np.max(np.abs(out - ref) / (np.abs(ref) + 1e-300))
+            print(f'{num_x:>10d} {num_x/t_np:>14.3e} {num_x/t_c:>14.3e} '
+                  f'{t_np/t_c:>9.1f} {err:>10.2e}')
+            if not err <= TOLERANCE:
+                failed.append(f'{mech} at {num_x} points')
+
+        # A single point: 0-d temperature, 1-d concentration
+        temp, conc = np.asarray(temp_0[0]), conc_0[:, 0]
+        for method, args in [('get_fwd_rate_coefficients', (temp,)),
+                             ('get_rxn_rate', (temp, conc)),
+                             ('get_rxn_rate_jacobian', (temp, conc))]:
+            ref = getattr(pyro_np, method)(*args)
+            result = getattr(pyro_c, method)(*args)
+            assert result.shape == np.shape(ref), (method, result.shape)
+            err = np.max(np.abs(result - ref) / (np.abs(ref) + 1e-300))
+            print(f'{"scalar":>10s} {method:>31s} {str(result.shape):>12s} '
+                  f'{err:>10.2e}')
+            if not err <= TOLERANCE:
+                failed.append(f'{mech} {method} at a single point')
+
+    if failed:
+        print(f'Error above {TOLERANCE:.0e}: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,42 @@
+import os
+import time
+import tempfile
+import cantera as ct
+from bench_mechanism import get_solution
+from minipyro.codegen.python import get_thermochem_class
+
+
+def time_call(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def run_minipyro():
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        os.environ['MINIPYRO_CACHE_DIR'] = cache_dir
+
+        # Write the filtered mechanism out, so that the cache is keyed on
+        # the file and a warm start never builds a ct.Solution
+        sol = get_solution('gri30.yaml')
+        mech_path = os.path.join(cache_dir, 'mech.yaml')
+        sol.write_yaml(mech_path)
+
+        t_solution = time_call(ct.Solution, mech_path)
+        t_nocache = time_call(get_thermochem_class, mech_path, use_cache=False)
+        t_cold = time_call(get_thermochem_class, mech_path)
+        t_warm = time_call(get_thermochem_class, mech_path)
+
+    print(f'{sol.n_reactions} reactions')
+    print(f'ct.Solution from YAML:   {t_solution:.4f} s')
+    print(f'generate, no cache:      {t_nocache:.4f} s')
+    print(f'generate, cold cache:    {t_cold:.4f} s')
+    print(f'load, warm cache:        {t_warm:.4f} s '
+          f'({t_nocache/t_warm:.0f}x faster)')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,85 @@
+import sys
+import tracemalloc
+import numpy as np
+from bench_mechanism import best_of, get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np
+
+
+def run_minipyro(num_x=10**4, repeat=3):
+    # Forward pass and gradient() under memory budgets, as fractions of
+    # what storing every node takes, against storing every node.
+    # Recomputing a node repeats the same operations, so the gradients must
+    # be bit for bit those of storing every node.
+
+    sol = get_solution('gri30.yaml')
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+    temp = np.tile(temp_0, num_x // 1000)
+    conc = np.tile(conc_0, num_x // 1000)
+    pyro_gas = get_thermochem_class(sol)(adiff_np)
+
+    def sensitivities(budget):
+        # None stores every node, as without a Checkpointer
+        checkpointer = adiff_np.Checkpointer(
+            float('inf') if budget is None else budget
+        )
+        with checkpointer:
+            rxn_rate = pyro_gas.get_rxn_rate(
+                adiff_np.AutodiffVariable(temp, name='temperature'),
+                adiff_np.AutodiffVariable(conc, name='concentration')
+            )
+        return rxn_rate.gradient(), checkpointer
+
+    def store_all():
+        rxn_rate = pyro_gas.get_rxn_rate(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        )
+        return rxn_rate.gradient()
+
+    def peak_memory(fn):
+        # Timed separately, tracing allocations slows NumPy down
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    ref = store_all()
+    graph_nbytes = sensitivities(None)[1].peak_nbytes
+    t_ref = best_of(store_all, repeat)
+    mem_ref = peak_memory(store_all)
+    print(f'{sol.n_reactions} reactions, {num_x} points, node values '
+          f'{graph_nbytes/2**20:.1f} MiB')
+
+    print('{:>12s} {:>12s} {:>10s} {:>12s} {:>12s} {:>10s}'.format(
+        'budget', 'peak [MiB]', 'time [s]', 'slowdown', 'recomputed',
+        'identical'
+    ))
+    print(f'{"store all":>12s} {mem_ref/2**20:>12.1f} {t_ref:>10.4f} '
+          f'{1:>12.2f} {0:>12d} {"":>10s}')
+    failed = []
+    for fraction in [1/2, 1/4, 1/8, 1/16]:
+        budget = int(fraction * graph_nbytes)
+        grads, checkpointer = sensitivities(budget)
+        same = all(np.array_equal(grads[k], ref[k]) for k in ref)
+        t_ckpt = best_of(lambda: sensitivities(budget), repeat)
+        mem_ckpt = peak_memory(lambda: sensitivities(budget))
+        print(f'{budget/2**20:>12.1f} {mem_ckpt/2**20:>12.1f} '
+              f'{t_ckpt:>10.4f} {t_ckpt/t_ref:>12.2f} '
+              f'{checkpointer.num_recomputed:>12d} {str(same):>10s}')
+        if not same:
+            failed.append(f'{budget/2**20:.1f} MiB')
+
+    if failed:
+        print(f'Gradients differ under budgets of {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    # Optional number of points
+    args = [int(float(a)) for a in sys.argv[1:2]]
+    run_minipyro(*args)
+    exit()
@@ -0,0 +1,59 @@
+import sys
+import numpy as np
+from bench_mechanism import best_of, get_solution, get_states, run_cantera
+from minipyro.chem_expr import get_mechanism, rxn_rate_expr
+from minipyro.codegen.cost import get_cost
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.symbolic import Variable, simplify
+
+
+def run_minipyro(bandwidth=10e9, peak_flops=20e9, num_x=10**5):
+    # Static estimates for the given machine, in bytes/s and operations/s,
+    # next to the measured throughput of the in-place NumPy class
+
+    temp = Variable('temperature')
+    conc = Variable('concentration')
+
+    print(f'Roofline for {bandwidth/1e9:.1f} GB/s and '
+          f'{peak_flops/1e9:.1f} GFLOP/s, ridge point '
+          f'{peak_flops/bandwidth:.2f} FLOP/B')
+    print('{:>10s} {:>12s} {:>7s} {:>6s} {:>6s} {:>10s} {:>8s} {:>13s} '
+          '{:>13s}'.format(
+              'mechanism', 'pass', 'flops', 'exp', 'bytes', 'FLOP/B',
+              'bound', 'model [pts/s]', 'numpy [pts/s]'
+          ))
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        sol = get_solution(mech)
+        species_names, reactions = get_mechanism(sol)
+        raw = [
+            rxn_rate_expr(rxn, species_names, temp, conc) for rxn in reactions
+        ]
+
+        pyro_gas = get_thermochem_class(sol, inplace=True)()
+        temp_0, mass_fracs_0 = get_states(sol, 1000)
+        conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+        temp_np = np.tile(temp_0, num_x // 1000)
+        conc_np = np.tile(conc_0, num_x // 1000)
+        out = np.empty((sol.n_reactions, num_x))
+        t_np = best_of(lambda: pyro_gas.get_rxn_rate(temp_np, conc_np,
+                                                     out=out))
+
+        for label, cost in [
+            ('raw', get_cost(raw)),
+            ('simplified', get_cost(simplify(raw))),
+            ('generated', pyro_gas.get_cost('get_rxn_rate')),
+        ]:
+            model = cost.roofline(bandwidth, peak_flops)
+            measured = f'{num_x/t_np:>13.3e}' if label == 'generated' else ''
+            print(f'{mech:>10s} {label:>12s} {cost.flops:>7d} '
+                  f'{cost.num_transcendentals:>6d} {cost.bytes:>6d} '
+                  f'{model["intensity"]:>10.2f} {model["bound"]:>8s} '
+                  f'{model["points_per_second"]:>13.3e} {measured:>13s}')
+    return
+
+
+if __name__ == '__main__':
+    # Optional machine: bandwidth in GB/s, then peak in GFLOP/s
+    args = [1e9 * float(a) for a in sys.argv[1:3]]
+    run_minipyro(*args)
+    exit()
@@ -0,0 +1,138 @@
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import numpy as np
+from bench_mechanism import (
+    best_of, get_solution, get_states, run_cantera
+)
+from minipyro.codegen import fortran
+from minipyro.codegen.python import get_thermochem_class
+
+
+# Largest relative error accepted against the Python backend. Fortran at
+# -O3 may reorder sums, which costs a few ulps, not more.
+TOLERANCE = 1e-10
+
+
+driver_str = """
+program driver
+
+    use Thermochemistry
+    implicit none
+
+    integer :: n, reps, r, u
+    integer(8) :: t0, t1, clock_rate
+    real(dp), allocatable :: temperature(:), concentration(:, :)
+    real(dp), allocatable :: rxn_rate(:, :), jac(:, :, :)
+
+    open(newunit=u, file='input.bin', access='stream', form='unformatted')
+    read(u) n, reps
+    allocate(temperature(n), concentration(n, num_species))
+    allocate(rxn_rate(n, num_reactions), jac(n, num_species + 1, num_reactions))
+    read(u) temperature, concentration
+    close(u)
+
+    call get_rxn_rate(temperature, concentration, rxn_rate)
+    call system_clock(t0, clock_rate)
+    do r = 1, reps
+        call get_rxn_rate(temperature, concentration, rxn_rate)
+    end do
+    call system_clock(t1)
+    print *, real(t1 - t0, dp) / clock_rate / reps
+
+    call get_rxn_rate_jacobian(temperature, concentration, jac)
+    call system_clock(t0)
+    do r = 1, reps
+        call get_rxn_rate_jacobian(temperature, concentration, jac)
+    end do
+    call system_clock(t1)
+    print *, real(t1 - t0, dp) / clock_rate / reps
+
+    open(newunit=u, file='output.bin', access='stream', form='unformatted', &
+        & status='replace')
+    write(u) rxn_rate, jac
+    close(u)
+
+end program
+"""
+
+
+def run_minipyro(reps=10):
+
+    fc = os.environ.get('FC', 'gfortran')
+    fflags = shlex.split(os.environ.get('FFLAGS', '-O3'))
+    if shutil.which(fc) is None:
+        print(f'Found no Fortran compiler {fc}, exiting gracefully.')
+        return
+
+    print('{:>12s} {:>8s} {:>14s} {:>14s} {:>14s} {:>14s} {:>9s}'.format(
+        'mechanism', 'cells', 'numpy [c/s]', 'fortran [c/s]', 'numpy J [c/s]',
+        'fortran J [c/s]', 'max err'
+    ))
+    # The dense GRI-3.0 Jacobian takes 128 kB per cell
+    failed = []
+    for mech, num_x in [('h2o2.yaml', 10**5), ('gri30.yaml', 10**3)]:
+        sol = get_solution(mech)
+        pyro_gas = get_thermochem_class(sol)()
+
+        # Sample states once and tile them, Cantera is slow on large grids
+        temp_0, mass_fracs_0 = get_states(sol, 1000)
+        conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+        temp = np.tile(temp_0, num_x // 1000)
+        conc = np.tile(conc_0, num_x // 1000)
+
+        with tempfile.TemporaryDirectory() as build_dir:
+            fortran.get_thermochem_class(
+                build_dir + '/', sol, vectorized=True
+            )
+            with open(os.path.join(build_dir, 'driver.f90'), 'w') as fh:
+                fh.write(driver_str)
+            subprocess.run(
+                [fc, *fflags, '-fopenmp', 'demo_codegen.f90', 'driver.f90',
+                 '-o', 'driver'],
+                cwd=build_dir, check=True
+            )
+
+            # Fortran's concentration(n, num_species) is NumPy's
+            # (num_species, n) in C order, and likewise for the outputs
+            with open(os.path.join(build_dir, 'input.bin'), 'wb') as fh:
+                fh.write(np.array([num_x, reps], dtype=np.int32).tobytes())
+                fh.write(temp.tobytes())
+                fh.write(conc.tobytes())
+            out = subprocess.run(
+                ['./driver'], cwd=build_dir, check=True,
+                capture_output=True, text=True
+            )
+            t_f, t_fj = map(float, out.stdout.split())
+            data = np.fromfile(os.path.join(build_dir, 'output.bin'))
+
+        num_rxns = sol.n_reactions
+        rxn_rate = data[:num_rxns * num_x].reshape(num_rxns, num_x)
+        jac = data[num_rxns * num_x:].reshape(num_rxns, -1, num_x)
+
+        t_np = best_of(lambda: pyro_gas.get_rxn_rate(temp, conc))
+        t_npj = best_of(lambda: pyro_gas.get_rxn_rate_jacobian(temp, conc))
+        ref = pyro_gas.get_rxn_rate(temp, conc)
+        ref_jac = pyro_gas.get_rxn_rate_jacobian(temp, conc)
+        err = max(
+            np.max(np.abs(rxn_rate - ref) / (np.abs(ref) + 1e-300)),
+            np.max(np.abs(jac - ref_jac)
+                   / (np.abs(ref_jac).max(axis=0) + 1e-300))
+        )
+        print(f'{mech:>12s} {num_x:>8d} {num_x/t_np:>14.3e} {num_x/t_f:>14.3e} '
+              f'{num_x/t_npj:>14.3e} {num_x/t_fj:>14.3e} {err:>9.1e}')
+        if not err <= TOLERANCE:
+            failed.append(mech)
+
+    if failed:
+        print(f'Error above {TOLERANCE:.0e} for {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
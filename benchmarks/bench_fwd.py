@@ -0,0 +1,55 @@
+import numpy as np
+from bench_mechanism import (
+    get_solution, get_states, get_subset, run_cantera
+)
+from bench_adiff import measure
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np, fwd_np
+
+
+def run_minipyro():
+
+    sol = get_subset(get_solution('gri30.yaml'), 100)
+    pyro_class = get_thermochem_class(sol)
+    num_species = sol.n_species
+
+    # Reverse mode yields the gradient of sum(R); forward mode yields every
+    # dR_i/dT, whose sum over reactions is compared against it
+    print(' '.join(['{:>8s}'] + 6 * ['{:>10s}'] + ['{:>9s}']).format(
+        'num_x', 'adiff [s]', 'adiff MiB', 'fwd T [s]', 'fwd T MiB',
+        'fwd TC [s]', 'fwd TC MiB', 'max diff'
+    ))
+    for num_x in [10**2, 10**3, 10**4]:
+        temp, mass_fracs = get_states(sol, num_x)
+        conc, _ = run_cantera(sol, temp, mass_fracs)
+
+        def reverse():
+            rxn_rate = pyro_class(adiff_np).get_rxn_rate(
+                adiff_np.AutodiffVariable(temp, name='temperature'),
+                adiff_np.AutodiffVariable(conc, name='concentration')
+            )
+            return rxn_rate.gradient()
+
+        def forward(num_dirs):
+            # Direction 0 is temperature, then one per species if requested
+            return pyro_class(fwd_np).get_rxn_rate(
+                fwd_np.seed(temp, num_dirs, 0),
+                fwd_np.seed(conc, num_dirs, range(1, num_dirs))
+            )
+
+        g_rev, t_rev, mem_rev = measure(reverse)
+        r_fwd, t_fwd, mem_fwd = measure(lambda: forward(1))
+        _, t_all, mem_all = measure(lambda: forward(1 + num_species))
+
+        ref = g_rev['temperature']
+        diff = np.max(np.abs(r_fwd.tangents[0].sum(axis=0) - ref)
+                      / (np.abs(ref) + 1e-300))
+        print(f'{num_x:>8d} {t_rev:>10.3f} {mem_rev/2**20:>10.1f} '
+              f'{t_fwd:>10.3f} {mem_fwd/2**20:>10.1f} '
+              f'{t_all:>10.3f} {mem_all/2**20:>10.1f} {diff:>9.1e}')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,62 @@
+import sys
+import numpy as np
+from bench_mechanism import (
+    best_of, get_solution, get_states, run_cantera
+)
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import lazy_np
+
+
+# Largest relative error accepted against the NumPy class. Both evaluate
+# the same expressions; the C compiler may contract or reorder a few.
+TOLERANCE = 1e-12
+
+
+def run_minipyro():
+
+    sol = get_solution()
+    pyro_class = get_thermochem_class(sol)
+    pyro_np = pyro_class()
+    pyro_lazy = pyro_class(lazy_np)
+
+    # Sample states once and tile them, Cantera is slow on large grids
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+
+    print('{:>10s} {:>16s} {:>16s} {:>9s} {:>10s}'.format(
+        'num_x', 'numpy [pts/s]', 'C/OpenMP [pts/s]', 'speedup', 'max rel err'
+    ))
+    failed = []
+    for num_x in [10**3, 10**4, 10**5, 10**6]:
+        reps = num_x // 1000
+        temp = np.tile(temp_0, reps)
+        conc = np.tile(conc_0, reps)
+
+        rxn_rate = pyro_lazy.get_rxn_rate(
+            lazy_np.Placeholder('temperature', temp.shape),
+            lazy_np.Placeholder('concentration', conc.shape)
+        )
+        rxn_rate.compile('get_rxn_rate', target='c')
+        out = np.empty(rxn_rate.shape)
+
+        t_np = best_of(lambda: pyro_np.get_rxn_rate(temp, conc))
+        t_c = best_of(
+            lambda: rxn_rate.evaluate(temperature=temp, concentration=conc,
+                                      out=out)
+        )
+        ref = pyro_np.get_rxn_rate(temp, conc)
+        err = np.max(np.abs(out - ref) / (np.abs(ref) + 1e-300))
+        print(f'{num_x:>10d} {num_x/t_np:>16.3e} {num_x/t_c:>16.3e} '
+              f'{t_np/t_c:>9.1f} {err:>10.2e}')
+        if not err <= TOLERANCE:
+            failed.append(f'{num_x} points')
+
+    if failed:
+        print(f'Error above {TOLERANCE:.0e} at {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,73 @@
+import os
+import sys
+import tempfile
+import subprocess
+from bench_mechanism import get_solution
+
+
+HEAVY = ('cantera', 'mako', 'loopy', 'pycuda')
+
+SCENARIOS = [
+    ('import minipyro', 'import minipyro', HEAVY + ('numpy',)),
+    ('adiff_np', 'from minipyro.pyro_np import adiff_np', HEAVY),
+    ('lazy_np', 'from minipyro.pyro_np import lazy_np', HEAVY),
+    ('cached class', (
+        'from minipyro.codegen.python import get_thermochem_class; '
+        'get_thermochem_class({mech_path!r})'
+    ), HEAVY),
+]
+
+
+def import_profile(stmt, env):
+    # -X importtime lines: 'import time: self [us] | cumulative | name'
+    out = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', stmt],
+        env=env, capture_output=True, text=True, check=True
+    ).stderr
+    total, modules = 0, set()
+    for line in out.splitlines()[1:]:
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the one that triggered them
+        if not name.startswith('   '):
+            total += int(cumulative)
+        modules.add(name.strip())
+    return total, modules
+
+
+def run_minipyro(max_ms=None):
+    failed = False
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, MINIPYRO_CACHE_DIR=cache_dir)
+        mech_path = os.path.join(cache_dir, 'mech.yaml')
+        get_solution().write_yaml(mech_path)
+        # Warm the cache
+        subprocess.run(
+            [sys.executable, '-c', SCENARIOS[-1][1].format(mech_path=mech_path)],
+            env=env, check=True
+        )
+
+        # Interpreter startup imports, common to every scenario
+        startup, _ = import_profile('pass', env)
+
+        print('{:>14s} {:>12s}  {:s}'.format('scenario', 'time [ms]', 'heavy'))
+        for label, stmt, forbidden in SCENARIOS:
+            total, modules = import_profile(
+                stmt.format(mech_path=mech_path), env
+            )
+            total -= startup
+            heavy = sorted(m for m in forbidden if m in modules)
+            too_slow = max_ms is not None and total > 1000 * max_ms
+            failed = failed or bool(heavy) or too_slow
+            print('{:>14s} {:>12.1f}  {:s}'.format(
+                label, total / 1000, ', '.join(heavy) or '-'
+            ))
+    return failed
+
+
+if __name__ == '__main__':
+    # Exits non-zero when a scenario pulls in a heavy dependency, or takes
+    # longer than the optional budget in milliseconds
+    max_ms = float(sys.argv[1]) if len(sys.argv) > 1 else None
+    exit(run_minipyro(max_ms))
@@ -0,0 +1,72 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+from bench_mechanism import get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+
+
+# Largest relative error accepted against the eager class. Quotients are
+# computed as products with shared reciprocals, a few ulps apart.
+TOLERANCE = 1e-12
+
+
+def measure(fn, repeat=5):
+    # Best wall time, then the peak traced allocation of one more call,
+    # timed separately since tracing slows down every allocation
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def run_minipyro():
+
+    failed = []
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        sol = get_solution(mech)
+        pyro_np = get_thermochem_class(sol)()
+        pyro_ip = get_thermochem_class(sol, inplace=True)()
+        print(f'{mech}: {sol.n_reactions} reactions')
+
+        temp_0, mass_fracs_0 = get_states(sol, 1000)
+        conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+
+        print('{:>10s} {:>10s} {:>12s} {:>12s} {:>14s} {:>10s}'.format(
+            'num_x', 'eager [s]', 'eager [MiB]', 'inplace [s]',
+            'inplace [KiB]', 'max rel err'
+        ))
+        for num_x in [10**3, 10**4, 10**5]:
+            reps = num_x // 1000
+            temp = np.tile(temp_0, reps)
+            conc = np.tile(conc_0, reps)
+            out = np.empty((sol.n_reactions, num_x))
+
+            # The first call allocates the workspace, later ones reuse it
+            pyro_ip.get_rxn_rate(temp, conc, out=out)
+            t_np, mem_np = measure(lambda: pyro_np.get_rxn_rate(temp, conc))
+            t_ip, mem_ip = measure(
+                lambda: pyro_ip.get_rxn_rate(temp, conc, out=out)
+            )
+            ref = np.asarray(pyro_np.get_rxn_rate(temp, conc))
+            err = np.max(np.abs(out - ref) / (np.abs(ref) + 1e-300))
+            print(f'{num_x:>10d} {t_np:>10.4f} {mem_np/2**20:>12.2f} '
+                  f'{t_ip:>12.4f} {mem_ip/2**10:>14.2f} {err:>10.2e}')
+            if not err <= TOLERANCE:
+                failed.append(f'{mech} at {num_x} points')
+
+    if failed:
+        print(f'Error above {TOLERANCE:.0e}: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
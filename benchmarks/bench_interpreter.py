@@ -0,0 +1,74 @@
+import sys
+import time
+import tracemalloc
+import numpy as np
+from bench_mechanism import get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import lazy_np
+
+
+# Largest relative error accepted against the eager class. The interpreter
+# applies the same ufuncs in the same order, chunk by chunk.
+TOLERANCE = 1e-12
+
+
+def measure(fn):
+    # Wall time and peak traced allocation of a single call
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run_minipyro():
+
+    sol = get_solution()
+    pyro_class = get_thermochem_class(sol)
+    pyro_np = pyro_class()
+    pyro_lazy = pyro_class(lazy_np)
+
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+
+    print('{:>10s} {:>12s} {:>12s} {:>12s} {:>12s} {:>10s}'.format(
+        'num_x', 'eager [s]', 'eager [MiB]', 'chunked [s]', 'chunked [MiB]',
+        'max rel err'
+    ))
+    failed = []
+    for num_x in [10**4, 10**5, 10**6]:
+        reps = num_x // 1000
+        temp = np.tile(temp_0, reps)
+        conc = np.tile(conc_0, reps)
+
+        rxn_rate = pyro_lazy.get_rxn_rate(
+            lazy_np.Placeholder('temperature', temp.shape),
+            lazy_np.Placeholder('concentration', conc.shape)
+        )
+        rxn_rate.compile('get_rxn_rate', target='numpy')
+        # The output buffer is shared, only temporaries count towards peak
+        out = np.empty(rxn_rate.shape)
+
+        t_np, mem_np = measure(lambda: pyro_np.get_rxn_rate(temp, conc))
+        t_ch, mem_ch = measure(
+            lambda: rxn_rate.evaluate(temperature=temp, concentration=conc,
+                                      out=out)
+        )
+        ref = pyro_np.get_rxn_rate(temp, conc)
+        err = np.max(np.abs(out - ref) / (np.abs(ref) + 1e-300))
+        print(f'{num_x:>10d} {t_np:>12.3f} {mem_np/2**20:>12.1f} '
+              f'{t_ch:>12.3f} {mem_ch/2**20:>12.1f} {err:>10.2e}')
+        if not err <= TOLERANCE:
+            failed.append(f'{num_x} points')
+
+    if failed:
+        print(f'Error above {TOLERANCE:.0e} at {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,113 @@
+import sys
+import time
+import numpy as np
+from bench_mechanism import (
+    get_solution, get_states, get_subset, run_cantera
+)
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np, fwd_np, lazy_np
+
+
+# Largest difference accepted, relative to the largest entry of each
+# column. Analytic and taped derivatives round differently, by a few ulps.
+TOLERANCE = 1e-12
+
+
+def get_jacobians(sol, temp, conc):
+    # The generated Jacobian under every pyro_np, by name
+    pyro_class = get_thermochem_class(sol)
+    num_dirs = 1 + sol.n_species
+
+    def get_lazy(target):
+        jac_lazy = pyro_class(lazy_np).get_rxn_rate_jacobian(
+            lazy_np.Placeholder('temperature', temp.shape),
+            lazy_np.Placeholder('concentration', conc.shape)
+        )
+        jac_lazy.compile('get_rxn_rate_jacobian', target=target)
+        return jac_lazy.evaluate(temperature=temp, concentration=conc)
+
+    return {
+        'numpy': pyro_class().get_rxn_rate_jacobian(temp, conc),
+        'adiff_np': pyro_class(adiff_np).get_rxn_rate_jacobian(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        ).values,
+        'fwd_np': pyro_class(fwd_np).get_rxn_rate_jacobian(
+            fwd_np.seed(temp, num_dirs, 0),
+            fwd_np.seed(conc, num_dirs, range(1, num_dirs))
+        ).values,
+        'lazy_np numpy': get_lazy('numpy'),
+        'lazy_np c': get_lazy('c'),
+    }
+
+
+def run_minipyro():
+
+    sol = get_subset(get_solution('gri30.yaml'), 100)
+    pyro_class = get_thermochem_class(sol)
+    num_species = sol.n_species
+
+    print('{:>8s} {:>14s} {:>12s} {:>12s} {:>9s}'.format(
+        'num_x', 'generated [s]', 'adiff [s]', 'fwd_np [s]', 'max diff'
+    ))
+    failed = []
+    for num_x in [10**2, 10**3, 10**4]:
+        temp, mass_fracs = get_states(sol, num_x)
+        conc, _ = run_cantera(sol, temp, mass_fracs)
+
+        t0 = time.perf_counter()
+        jac = pyro_class().get_rxn_rate_jacobian(temp, conc)
+        t_gen = time.perf_counter() - t0
+
+        # Reverse mode: build the graph once, one backward pass per reaction
+        t0 = time.perf_counter()
+        rxn_rate = pyro_class(adiff_np).get_rxn_rate(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        )
+        jac_ad = np.empty_like(jac)
+        for i in range(sol.n_reactions):
+            g = rxn_rate[i].gradient()
+            jac_ad[i, 0] = g['temperature']
+            jac_ad[i, 1:] = g['concentration']
+        t_ad = time.perf_counter() - t0
+
+        # Forward mode: one pass, temperature then one direction per species
+        t0 = time.perf_counter()
+        num_dirs = 1 + num_species
+        pyro_class(fwd_np).get_rxn_rate(
+            fwd_np.seed(temp, num_dirs, 0),
+            fwd_np.seed(conc, num_dirs, range(1, num_dirs))
+        )
+        t_fwd = time.perf_counter() - t0
+
+        # Relative to the largest entry of each column
+        scale = np.abs(jac_ad).max(axis=0) + 1e-300
+        diff = np.max(np.abs(jac - jac_ad) / scale)
+        print(f'{num_x:>8d} {t_gen:>14.3f} {t_ad:>12.3f} {t_fwd:>12.3f} '
+              f'{diff:>9.1e}')
+        if not diff <= TOLERANCE:
+            failed.append(f'adiff_np at {num_x} points')
+
+    print('\n{:>8s} {:>13s} {:>9s}'.format('mech', 'pyro_np', 'max diff'))
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        sol = get_solution(mech)
+        temp, mass_fracs = get_states(sol, 100)
+        conc, _ = run_cantera(sol, temp, mass_fracs)
+        jacs = get_jacobians(sol, temp, conc)
+        scale = np.abs(jacs['numpy']).max(axis=(0, 2))[:, None] + 1e-300
+        for name in [n for n in jacs if n != 'numpy']:
+            diff = np.max(np.abs(jacs[name] - jacs['numpy']) / scale)
+            print(f'{mech[:-5]:>8s} {name:>13s} {diff:>9.1e}')
+            if not diff <= TOLERANCE:
+                failed.append(f'{name} on {mech}')
+
+    if failed:
+        print(f'Difference above {TOLERANCE:.0e}: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,42 @@
+import time
+from bench_symbolic import build
+from minipyro.codegen.mappers import CodeGenerationMapper
+from minipyro.symbolic import Variable
+
+
+def deep_chain(depth):
+    # Alternating sums and products do not flatten, so the tree is as deep
+    # as it is long, well past the default recursion limit
+    x = Variable('x')
+    expr = x
+    for i in range(depth):
+        expr = (expr * x) if i % 2 else (expr + 1.0)
+    return expr
+
+
+def run_minipyro():
+    print('{:>10s} {:>14s} {:>12s} {:>16s}'.format(
+        'reactions', 'unique nodes', 'codegen [s]', 'per node [us]'
+    ))
+    for num_rxns in [1_000, 10_000, 50_000]:
+        exprs, num_nodes = build(num_rxns, intern=True)
+        cgm = CodeGenerationMapper()
+        t0 = time.perf_counter()
+        for e in exprs:
+            cgm.rec(e)
+        t_cg = time.perf_counter() - t0
+        print(f'{num_rxns:>10d} {num_nodes:>14d} {t_cg:>12.3f} '
+              f'{1e6*t_cg/num_nodes:>16.2f}')
+
+    depth = 5_000
+    t0 = time.perf_counter()
+    code_str = CodeGenerationMapper().rec(deep_chain(depth))
+    t_cg = time.perf_counter() - t0
+    print(f'Chain of depth {depth}: {len(code_str)} characters '
+          f'in {t_cg:.3f} s')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
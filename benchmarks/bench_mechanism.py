@@ -0,0 +1,97 @@
+import time
+import warnings
+import cantera as ct
+import numpy as np
+from minipyro.codegen.python import get_thermochem_class
+
+
+def get_solution(mech='h2o2.yaml'):
+    # Keep the reactions minipyro can generate code for
+    gas = ct.Solution(mech)
+    reactions = [
+        r for r in gas.reactions() if isinstance(r.rate, ct.ArrheniusRate)
+    ]
+    return ct.Solution(
+        thermo='ideal-gas', kinetics='gas',
+        species=gas.species(), reactions=reactions
+    )
+
+
+def get_subset(sol, num_rxns):
+    return ct.Solution(
+        thermo='ideal-gas', kinetics='gas',
+        species=sol.species(), reactions=sol.reactions()[:num_rxns]
+    )
+
+
+def get_states(sol, num_x, seed=0):
+    rng = np.random.default_rng(seed)
+    temp = rng.uniform(800, 2500, num_x)
+    mass_fracs = rng.uniform(0, 1, (sol.n_species, num_x))
+    mass_fracs /= mass_fracs.sum(axis=0)
+    return temp, mass_fracs
+
+
+def run_cantera(sol, temp, mass_fracs):
+    num_x = temp.shape[0]
+    conc = np.empty((sol.n_species, num_x))
+    rates = np.empty((sol.n_reactions, num_x))
+    for i in range(num_x):
+        sol.TPY = temp[i], ct.one_atm, mass_fracs[:, i]
+        conc[:, i] = sol.concentrations
+        rates[:, i] = sol.forward_rates_of_progress
+    return conc, rates
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def run_minipyro():
+
+    sol = get_solution()
+    t0 = time.perf_counter()
+    pyro_gas = get_thermochem_class(sol)()
+    t_gen = time.perf_counter() - t0
+    print(f'{sol.n_reactions} reactions, code generation: {t_gen:.3f} s')
+
+    # Straight from the YAML file, the falloff reactions are left out on
+    # request, leaving the same reactions as get_solution
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        full_gas = get_thermochem_class(
+            'h2o2.yaml', use_cache=False, skip_unsupported=True
+        )
+    assert full_gas.num_reactions == sol.n_reactions
+    print(caught[0].message)
+
+    print('{:>10s} {:>14s} {:>14s} {:>9s} {:>10s}'.format(
+        'num_x', 'cantera [s]', 'minipyro [s]', 'speedup', 'max rel err'
+    ))
+    for num_x in [10**2, 10**3, 10**4, 10**5]:
+        temp, mass_fracs = get_states(sol, num_x)
+
+        t0 = time.perf_counter()
+        conc, ct_rates = run_cantera(sol, temp, mass_fracs)
+        t_ct = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        pyro_rates = pyro_gas.get_rxn_rate(temp, conc)
+        t_pyro = time.perf_counter() - t0
+
+        err = np.max(
+            np.abs(pyro_rates - ct_rates) / (np.abs(ct_rates) + 1e-300)
+        )
+        print(f'{num_x:>10d} {t_ct:>14.4e} {t_pyro:>14.4e} '
+              f'{t_ct/t_pyro:>9.1f} {err:>10.2e}')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+from bench_mechanism import best_of, get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np.parallel import ParallelThermochemistry
+
+
+def run_minipyro(num_x=10**6, chunk_size=8192, repeat=3):
+    # Strong scaling: a fixed grid over more and more workers. Efficiency
+    # is t_1 / (p t_p), relative to the same executor with one worker.
+
+    sol = get_solution('h2o2.yaml')
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+    temp = np.tile(temp_0, num_x // 1000)
+    conc = np.tile(conc_0, num_x // 1000)
+
+    num_cpus = os.cpu_count()
+    worker_counts = sorted({1, 2, 4, num_cpus})
+    print(f'{sol.n_reactions} reactions, {num_x} points, chunk size '
+          f'{chunk_size}, {num_cpus} CPUs')
+
+    serial = get_thermochem_class(sol)()
+    ref = serial.get_rxn_rate(temp, conc)
+    t_serial = best_of(lambda: serial.get_rxn_rate(temp, conc), repeat)
+    print(f'serial eager get_rxn_rate: {t_serial:.4f} s')
+
+    print('{:>8s} {:>8s} {:>8s} {:>10s} {:>12s} {:>9s} {:>10s}'.format(
+        'class', 'pool', 'workers', 'time [s]', 'pts/s', 'effic.',
+        'max rel err'
+    ))
+    # In-place classes in single and mixed precision write float32 outputs.
+    # Each case has the largest relative error accepted against the serial
+    # float64 rates, as in bench_precision.
+    cases = [
+        ('eager', {}, 1e-12), ('inplace', {'inplace': True}, 1e-12),
+        ('f32', {'inplace': True, 'dtype': 'float32'}, 1e-4),
+        ('mixed', {'inplace': True, 'dtype': 'float32', 'mixed': True},
+         1e-5),
+    ]
+    failed = []
+    for label, kwargs, tolerance in cases:
+        cls = get_thermochem_class(sol, **kwargs)
+        for executor in ['thread', 'process']:
+            t_1 = None
+            for num_workers in worker_counts:
+                with ParallelThermochemistry(
+                        cls, num_workers, chunk_size, executor) as par:
+                    out = par.empty((sol.n_reactions, num_x))
+                    t_p = best_of(
+                        lambda: par.get_rxn_rate(temp, conc, out=out), repeat
+                    )
+                    err = np.max(np.abs(out - ref) / (np.abs(ref) + 1e-300))
+                    del out
+                t_1 = t_1 or t_p
+                print(f'{label:>8s} {executor:>8s} {num_workers:>8d} '
+                      f'{t_p:>10.4f} {num_x/t_p:>12.3e} '
+                      f'{t_1/(num_workers*t_p):>9.2f} {err:>10.2e}')
+                if not err <= tolerance:
+                    failed.append(f'{label} {executor} {num_workers}')
+
+    if failed:
+        print(f'Error above tolerance: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    # Optional grid size and chunk size
+    args = [int(float(a)) for a in sys.argv[1:3]]
+    run_minipyro(*args)
+    exit()
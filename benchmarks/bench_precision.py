@@ -0,0 +1,114 @@
+import sys
+import time
+import numpy as np
+from bench_mechanism import get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np, lazy_np
+from minipyro.pyro_np.loopy import get_loopy_source
+
+
+# Accuracy of the float32 and mixed precision pipelines against float64
+# Cantera. Relative errors are over the rates whose magnitude float32 can
+# represent as a normal number; the rest are counted as underflows.
+TINY = np.finfo(np.float32).tiny
+# Largest relative error accepted per precision. Rounding a float32 exp
+# argument x costs |x| ulps of the result, about 1e-5 for the largest ones;
+# mixed keeps those arguments in float64.
+TOLERANCES = {'float64': 1e-12, 'float32': 1e-4, 'mixed': 1e-5}
+
+
+def get_errors(result, ref):
+    mask = np.abs(ref) > TINY
+    err = np.abs(result.astype(np.float64) - ref)[mask] / np.abs(ref)[mask]
+    underflows = np.count_nonzero(mask & (result == 0))
+    return np.max(err), np.median(err), underflows
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def run_minipyro(num_x=1000):
+
+    print('{:>8s} {:>26s} {:>10s} {:>12s} {:>12s} {:>10s}'.format(
+        'mech', 'case', 'time [s]', 'max rel err', 'median', 'underflows'
+    ))
+    failed = []
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        sol = get_solution(mech)
+        temp, mass_fracs = get_states(sol, num_x)
+        conc, ref = run_cantera(sol, temp, mass_fracs)
+
+        def report(case, label, result, ref, elapsed):
+            err_max, err_med, underflows = get_errors(result, ref)
+            print(f'{mech[:-5]:>8s} {case:>26s} {elapsed:>10.4f} '
+                  f'{err_max:>12.2e} {err_med:>12.2e} {underflows:>10d}')
+            if not err_max <= TOLERANCES[label]:
+                failed.append(f'{mech} {case}')
+
+        for dtype, mixed in [('float64', False), ('float32', False),
+                             ('float32', True)]:
+            label = 'mixed' if mixed else dtype
+            for inplace in [False, True]:
+                gas = get_thermochem_class(
+                    sol, inplace=inplace, dtype=dtype, mixed=mixed
+                )()
+                result, elapsed = timed(lambda: gas.get_rxn_rate(temp, conc))
+                assert result.dtype == np.dtype(dtype)
+                report(f'{"inplace" if inplace else "eager"} {label}',
+                       label, result, ref, elapsed)
+
+            # The lazy_np graph through the chunked interpreter
+            rxn_rate = get_thermochem_class(sol)(lazy_np).get_rxn_rate(
+                lazy_np.Placeholder('temperature', temp.shape),
+                lazy_np.Placeholder('concentration', conc.shape)
+            )
+            rxn_rate.compile('get_rxn_rate', target='numpy', dtype=dtype,
+                             mixed=mixed)
+            result, elapsed = timed(
+                lambda: rxn_rate.evaluate(temperature=temp,
+                                          concentration=conc)
+            )
+            report(f'lazy numpy {label}', label, result, ref, elapsed)
+
+            # Kernels for the GPU print constants as float literals
+            _, lp_args, lp_instructions = get_loopy_source(
+                rxn_rate, dtype, mixed
+            )
+            assert ('f *' in lp_instructions) == (dtype == 'float32')
+            assert all(d == dtype or mixed for _, _, d in lp_args)
+
+        # Gradients of the summed rates, against the float64 sweep
+        grads = {}
+        for dtype, mixed in [('float64', False), ('float32', False),
+                             ('float32', True)]:
+            gas = get_thermochem_class(sol, dtype=dtype, mixed=mixed)(
+                adiff_np
+            )
+            temp_dtype = np.float64 if mixed else dtype
+            rxn_rate = gas.get_rxn_rate(
+                adiff_np.AutodiffVariable(temp.astype(temp_dtype),
+                                          name='temperature'),
+                adiff_np.AutodiffVariable(conc.astype(dtype),
+                                          name='concentration')
+            )
+            grads[dtype, mixed], elapsed = timed(rxn_rate.gradient)
+            if dtype == 'float64':
+                continue
+            label = 'mixed' if mixed else dtype
+            for name in ['temperature', 'concentration']:
+                report(f'd/d{name[:4]} {label}', label,
+                       grads[dtype, mixed][name],
+                       grads['float64', False][name], elapsed)
+
+    if failed:
+        print(f'Error above tolerance: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
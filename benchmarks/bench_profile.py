@@ -0,0 +1,81 @@
+import os
+import tempfile
+import numpy as np
+from bench_mechanism import (
+    best_of, get_solution, get_states, get_subset, run_cantera
+)
+from minipyro.codegen.python import generate_code, get_thermochem_class
+from minipyro.profiling import Collector
+from minipyro.pyro_np import adiff_np
+
+
+def tiled_states(sol, num_x):
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+    return np.tile(temp_0, num_x // 1000), np.tile(conc_0, num_x // 1000)
+
+
+def run_minipyro():
+
+    # Classes generated without profiling carry no instrumentation
+    sol = get_solution('gri30.yaml')
+    for inplace in [False, True]:
+        src = generate_code(sol, inplace)
+        assert 'collector' not in src and 'perf_counter' not in src
+        assert generate_code(sol, inplace, profile=True).startswith(src)
+    print('Unprofiled classes contain no instrumentation')
+
+    print('\n{:>22s} {:>8s} {:>12s} {:>13s} {:>13s}'.format(
+        'case', 'num_x', 'plain [s]', 'profiled [s]', 'overhead [us]'
+    ))
+    for num_x in [10**3, 10**5]:
+        temp, conc = tiled_states(sol, num_x)
+        for inplace in [False, True]:
+            plain = get_thermochem_class(sol, inplace=inplace)()
+            profiled = get_thermochem_class(
+                sol, inplace=inplace, profile=True
+            )()
+            kwargs = {'out': np.empty((sol.n_reactions, num_x))} \
+                if inplace else {}
+            t_plain = best_of(lambda: plain.get_rxn_rate(temp, conc, **kwargs))
+            t_prof = best_of(
+                lambda: profiled.get_rxn_rate(temp, conc, **kwargs)
+            )
+            label = 'get_rxn_rate' + (' inplace' if inplace else '')
+            print(f'{label:>22s} {num_x:>8d} {t_plain:>12.4e} '
+                  f'{t_prof:>13.4e} {1e6*(t_prof - t_plain):>13.1f}')
+
+    # Gradient sweeps, profiled into a collector of their own
+    sol = get_subset(sol, 100)
+    pyro_gas = get_thermochem_class(sol)(adiff_np)
+    collector = Collector()
+    for num_x in [10**3, 10**4]:
+        temp, conc = tiled_states(sol, num_x)
+        rxn_rate = pyro_gas.get_rxn_rate(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        )
+        t_plain = best_of(rxn_rate.gradient)
+        collector.clear()
+        t_prof = best_of(lambda: rxn_rate.gradient(collector))
+        print(f'{"gradient":>22s} {num_x:>8d} {t_plain:>12.4e} '
+              f'{t_prof:>13.4e} {1e6*(t_prof - t_plain):>13.1f}')
+
+    stats = collector.as_dict()
+    print(f'\n{"region":>36s} {"calls":>7s} {"time [s]":>10s} '
+          f'{"result MiB":>11s}')
+    for name, entry in sorted(stats.items(), key=lambda i: -i[1]['time']):
+        print(f'{name:>36s} {entry["calls"]:>7d} {entry["time"]:>10.4f} '
+              f'{entry["result_bytes"]/2**20:>11.1f}')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'trace.json')
+        trace = collector.to_chrome_trace(path)
+        print(f'\nChrome trace: {len(trace["traceEvents"])} events, '
+              f'{os.path.getsize(path)/2**20:.1f} MiB')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
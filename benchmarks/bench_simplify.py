@@ -0,0 +1,51 @@
+import time
+from bench_mechanism import get_solution
+from minipyro.chem_expr import get_mechanism, arrhenius_expr, rxn_rate_expr
+from minipyro.codegen.cse import count_ops, eliminate_common_subexpressions
+from minipyro.symbolic import Variable, simplify
+
+
+def count_evaluated_ops(exprs):
+    # After CSE, i.e. what the generated code evaluates
+    cse = eliminate_common_subexpressions(exprs)
+    return count_ops(cse.exprs + [rhs for _, rhs in cse.assignments])
+
+
+def transcendentals(ops):
+    return ops['exp'] + ops['log']
+
+
+def run_minipyro():
+
+    temp = Variable('temperature')
+    conc = Variable('concentration')
+
+    print('{:>16s} {:>6s} {:>22s} {:>22s} {:>10s}'.format(
+        'mechanism', 'rxns', 'exp+log/div (raw)', 'exp+log/div (simpl.)',
+        'time [s]'
+    ))
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        species_names, reactions = get_mechanism(get_solution(mech))
+        for label, exprs in [
+            ('k_f', [arrhenius_expr(rxn, temp) for rxn in reactions]),
+            ('rate', [
+                rxn_rate_expr(rxn, species_names, temp, conc)
+                for rxn in reactions
+            ]),
+        ]:
+            t0 = time.perf_counter()
+            simplified = simplify(exprs)
+            t_simpl = time.perf_counter() - t0
+
+            raw = count_evaluated_ops(exprs)
+            new = count_evaluated_ops(simplified)
+            print(f'{mech + " " + label:>16s} {len(reactions):>6d} '
+                  f'{transcendentals(raw):>14d}/{raw["div"]:<7d} '
+                  f'{transcendentals(new):>14d}/{new["div"]:<7d} '
+                  f'{t_simpl:>10.3f}')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
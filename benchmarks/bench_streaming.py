@@ -0,0 +1,150 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+from bench_mechanism import get_solution, get_states, run_cantera
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np.streaming import StreamingDriver, open_input
+
+
+# Largest relative error accepted against direct calls. Streaming runs the
+# same class on slices of the same inputs.
+TOLERANCE = 1e-12
+
+def get_rss():
+    # Current resident set size in bytes, Linux only
+    with open('/proc/self/statm') as fh:
+        return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_snapshot(sol, tmp_dir, num_x):
+    # Raw binary temperature, .npy concentration, as CFD codes write them
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+    temp_path = os.path.join(tmp_dir, 'temperature.bin')
+    conc_path = os.path.join(tmp_dir, 'concentration.npy')
+    temp = np.memmap(temp_path, dtype=np.float64, mode='w+', shape=(num_x,))
+    conc = np.lib.format.open_memmap(
+        conc_path, mode='w+', shape=(sol.n_species, num_x)
+    )
+    for start in range(0, num_x, 10**5):
+        stop = min(start + 10**5, num_x)
+        temp[start:stop] = np.resize(temp_0, stop - start)
+        conc[:, start:stop] = np.resize(conc_0, (sol.n_species, stop - start))
+    temp.flush()
+    conc.flush()
+    del temp, conc
+    return temp_path, conc_path
+
+
+def run_minipyro(num_x=4 * 10**6, chunk_size=16384):
+
+    sol = get_solution('h2o2.yaml')
+    cls = get_thermochem_class(sol)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_path, conc_path = write_snapshot(sol, tmp_dir, num_x)
+        temp = open_input(temp_path, shape=(num_x,))
+        conc = open_input(conc_path)
+        out_path = os.path.join(tmp_dir, 'rxn_rate.npy')
+        file_mib = (temp.nbytes + conc.nbytes
+                    + 8 * sol.n_reactions * num_x) / 2**20
+        print(f'{sol.n_reactions} reactions, {num_x} points, chunk size '
+              f'{chunk_size}, inputs and output {file_mib:.0f} MiB')
+
+        print('{:>10s} {:>10s} {:>14s}'.format(
+            'prefetch', 'time [s]', 'max RSS [MiB]'
+        ))
+        for prefetch in [False, True]:
+            rss = []
+            rss_0 = get_rss()
+            t0 = time.perf_counter()
+            StreamingDriver(cls, chunk_size, prefetch).run(
+                temp, conc, out_path, resume=False,
+                callback=lambda k, n: rss.append(get_rss() - rss_0)
+            )
+            elapsed = time.perf_counter() - t0
+            print(f'{str(prefetch):>10s} {elapsed:>10.3f} '
+                  f'{max(rss)/2**20:>14.1f}')
+
+        # Check against a direct call, a slice at a time
+        out = np.load(out_path, mmap_mode='r')
+        gas = cls()
+        err = 0
+        for start in range(0, num_x, 10**6):
+            stop = min(start + 10**6, num_x)
+            ref = gas.get_rxn_rate(temp[start:stop], conc[:, start:stop])
+            err = max(err, np.max(
+                np.abs(out[:, start:stop] - ref) / (np.abs(ref) + 1e-300)
+            ))
+        print(f'max rel err {err:.2e}')
+        failed = [] if err <= TOLERANCE else [f'error above {TOLERANCE:.0e}']
+
+        # Interrupt halfway, then resume
+        num_chunks = -(-num_x // chunk_size)
+        done = []
+
+        def interrupt(k, n):
+            done.append(k)
+            if len(done) == num_chunks // 2:
+                raise Interrupted
+        driver = StreamingDriver(cls, chunk_size)
+        resumed_path = os.path.join(tmp_dir, 'resumed.npy')
+        try:
+            driver.run(temp, conc, resumed_path, callback=interrupt)
+        except Interrupted:
+            pass
+        resumed = []
+        driver.run(temp, conc, resumed_path,
+                   callback=lambda k, n: resumed.append(k))
+        same = np.array_equal(np.load(resumed_path, mmap_mode='r'), out)
+        print(f'interrupted after {len(done)} of {num_chunks} chunks, '
+              f'resumed at chunk {resumed[0]}, output identical: {same}')
+        if resumed[0] != len(done) or not same:
+            failed.append('resumed run')
+
+        # Progress of another class, or of other inputs, is not resumed
+        inplace_cls = get_thermochem_class(sol, inplace=True)
+        StreamingDriver(inplace_cls, chunk_size).run(temp, conc, resumed_path)
+        restarted = []
+        driver.run(temp, conc, resumed_path,
+                   callback=lambda k, n: restarted.append(k))
+        print(f'after a run of another class, restarted at chunk '
+              f'{restarted[0]}')
+        if restarted[0] != 0:
+            failed.append('run after another class')
+        try:
+            StreamingDriver(inplace_cls, chunk_size).run(
+                temp, conc, resumed_path, grad_path=resumed_path + '.grad'
+            )
+        except ValueError as e:
+            print(f'sensitivities of an in-place class: {e}')
+        else:
+            failed.append('sensitivities of an in-place class')
+
+        # Sensitivities through adiff_np, on a smaller prefix
+        num_sens = min(num_x, 2 * 10**5)
+        t0 = time.perf_counter()
+        _, grad = StreamingDriver(cls, chunk_size).run(
+            temp[:num_sens], conc[:, :num_sens],
+            os.path.join(tmp_dir, 'sens_rate.npy'),
+            grad_path=os.path.join(tmp_dir, 'sens.npy'), resume=False
+        )
+        print(f'sensitivities of {num_sens} points: '
+              f'{time.perf_counter() - t0:.3f} s, shape {grad.shape}')
+
+    if failed:
+        print(f'Failed: {", ".join(failed)}')
+        sys.exit(1)
+    return
+
+
+if __name__ == '__main__':
+    # Optional number of points and chunk size
+    args = [int(float(a)) for a in sys.argv[1:3]]
+    run_minipyro(*args)
+    exit()
@@ -0,0 +1,206 @@
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from functools import partial
+import numpy as np
+from bench_mechanism import (
+    best_of, get_solution, get_states, get_subset, run_cantera
+)
+from bench_symbolic import build
+from minipyro import cache
+from minipyro.codegen.cse import eliminate_common_subexpressions
+from minipyro.codegen.mappers import CodeGenerationMapper
+from minipyro.codegen.python import get_thermochem_class
+from minipyro.pyro_np import adiff_np
+from minipyro.symbolic import simplify
+
+
+# Lower is better for every compared metric. Differences below the floor
+# are noise (e.g. a few allocator pages) and never count as regressions.
+METRICS = {'time': 1e-4, 'peak_mem': 2**16}
+
+
+# {{{ Cases
+
+def tiled_states(sol, num_x):
+    # Cantera is slow on large grids, so sample 1000 states and tile them
+    temp_0, mass_fracs_0 = get_states(sol, 1000)
+    conc_0, _ = run_cantera(sol, temp_0, mass_fracs_0)
+    reps = -(-num_x // 1000)
+    return (np.tile(temp_0, reps)[:num_x],
+            np.tile(conc_0, reps)[:, :num_x])
+
+
+def make_codegen(mech):
+    sol = get_solution(mech)
+    return partial(get_thermochem_class, sol, use_cache=False)
+
+
+def make_rxn_rate(mech, num_x, inplace):
+    sol = get_solution(mech)
+    pyro_gas = get_thermochem_class(sol, inplace=inplace)()
+    temp, conc = tiled_states(sol, num_x)
+    if inplace:
+        out = np.empty((sol.n_reactions, num_x))
+        return partial(pyro_gas.get_rxn_rate, temp, conc, out=out)
+    return partial(pyro_gas.get_rxn_rate, temp, conc)
+
+
+def make_adiff(num_x, gradient):
+    sol = get_subset(get_solution('gri30.yaml'), 100)
+    pyro_gas = get_thermochem_class(sol)(adiff_np)
+    temp, conc = tiled_states(sol, num_x)
+
+    def forward():
+        return pyro_gas.get_rxn_rate(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        )
+    if gradient:
+        rxn_rate = forward()
+        return rxn_rate.gradient
+    return forward
+
+
+def make_mapper(num_rxns, mapper):
+    exprs, _ = build(num_rxns, intern=True)
+    if mapper == 'codegen':
+        def run():
+            cgm = CodeGenerationMapper()
+            for e in exprs:
+                cgm.rec(e)
+        return run
+    if mapper == 'simplify':
+        return partial(simplify, exprs)
+    return partial(eliminate_common_subexpressions, exprs)
+
+
+def get_cases(max_num_x):
+    # (name, setup) pairs, setup returns the callable to measure and is
+    # only run for the selected cases
+    cases = []
+    for mech in ['h2o2.yaml', 'gri30.yaml']:
+        cases.append((f'codegen/{mech}', partial(make_codegen, mech)))
+    for mech, sizes in [('h2o2.yaml', [10**k for k in range(3, 8)]),
+                        ('gri30.yaml', [10**3, 10**4, 10**5])]:
+        for num_x in sizes:
+            if num_x > max_num_x:
+                continue
+            for mode in ['numpy', 'inplace']:
+                cases.append((
+                    f'rxn_rate/{mode}/{mech}/{num_x}',
+                    partial(make_rxn_rate, mech, num_x, mode == 'inplace')
+                ))
+    for num_x in [10**3, 10**4]:
+        for phase in ['forward', 'gradient']:
+            cases.append((
+                f'adiff/{phase}/{num_x}',
+                partial(make_adiff, num_x, phase == 'gradient')
+            ))
+    for num_rxns in [10**3, 10**4]:
+        for mapper in ['codegen', 'simplify', 'cse']:
+            cases.append((
+                f'mappers/{mapper}/{num_rxns}',
+                partial(make_mapper, num_rxns, mapper)
+            ))
+    return cases
+
+# }}}
+
+
+# {{{ Measurement and comparison
+
+def measure(fn, repeat):
+    # Best wall time after a warm-up call, then the peak traced allocation
+    # of one more call, as tracing slows down every allocation
+    fn()
+    elapsed = best_of(fn, repeat)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': elapsed, 'peak_mem': peak}
+
+
+def get_metadata():
+    from importlib.metadata import version
+    return {
+        'minipyro': cache.get_version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'cantera': version('cantera'),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Returns whether any metric got worse than baseline * (1 + tolerance)
+    failed = False
+    print('\n{:<36s} {:>9s} {:>12s} {:>12s} {:>7s}  {:s}'.format(
+        'case', 'metric', 'baseline', 'current', 'ratio', 'status'
+    ))
+    for name, metrics in results.items():
+        if name not in baseline:
+            print(f'{name:<36s} {"":>9s} {"":>12s} {"":>12s} {"":>7s}  new')
+            continue
+        for metric, floor in METRICS.items():
+            old, new = baseline[name][metric], metrics[metric]
+            ratio = new / old if old else float('inf')
+            worse = new > old * (1 + tolerance) and new - old > floor
+            failed = failed or worse
+            print(f'{name:<36s} {metric:>9s} {old:>12.4g} {new:>12.4g} '
+                  f'{ratio:>7.2f}  {"REGRESSION" if worse else "ok"}')
+    return failed
+
+# }}}
+
+
+def run_minipyro(output=None, baseline=None, tolerance=0.25, select=None,
+                 max_num_x=10**6, repeat=5):
+    cases = [
+        (name, setup) for name, setup in get_cases(max_num_x)
+        if select is None or select in name
+    ]
+    results = {}
+    print('{:<36s} {:>12s} {:>12s}'.format('case', 'time [s]', 'peak [MiB]'))
+    for name, setup in cases:
+        results[name] = measure(setup(), repeat)
+        print(f'{name:<36s} {results[name]["time"]:>12.4e} '
+              f'{results[name]["peak_mem"]/2**20:>12.2f}')
+
+    if output is not None:
+        with open(output, 'w') as fh:
+            json.dump({'metadata': get_metadata(), 'results': results}, fh,
+                      indent=2)
+
+    if baseline is None:
+        return False
+    with open(baseline) as fh:
+        return compare(results, json.load(fh)['results'], tolerance)
+
+
+if __name__ == '__main__':
+    # Exits non-zero when a case regressed against the baseline
+    parser = argparse.ArgumentParser(
+        description='Run the benchmark suite, optionally writing results '
+                    'as JSON and comparing them to a stored baseline'
+    )
+    parser.add_argument('-o', '--output', help='JSON file to write results to')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare to')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown (default: 0.25)')
+    parser.add_argument('-k', '--select',
+                        help='only run cases whose name contains this')
+    parser.add_argument('--max-num-x', type=float, default=1e6,
+                        help='largest grid size (default: 1e6, at most 1e7)')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sys.exit(run_minipyro(
+        args.output, args.baseline, args.tolerance, args.select,
+        int(args.max_num_x), args.repeat
+    ))
@@ -0,0 +1,72 @@
+import time
+import tracemalloc
+import numpy as np
+from minipyro.symbolic import Variable, interned
+
+
+def build_mechanism(num_rxns, num_species=50, seed=0):
+    # Arrhenius rates of progress with parameters drawn from a small set,
+    # as in real mechanisms where many reactions share b and Ea
+    rng = np.random.default_rng(seed)
+    exp = Variable('exp')
+    log = Variable('log')
+    temp = Variable('temperature')
+    conc = Variable('concentration')
+
+    log_a = rng.choice(np.linspace(20, 35, 64), num_rxns).tolist()
+    b = rng.choice(np.linspace(-2, 2, 9), num_rxns).tolist()
+    act_temp = rng.choice(np.linspace(-20000, 0, 64), num_rxns).tolist()
+    idx = rng.integers(0, num_species, (num_rxns, 2)).tolist()
+
+    exprs = []
+    for k in range(num_rxns):
+        i, j = idx[k]
+        exprs.append(
+            exp(log_a[k] + b[k] * log(temp) + act_temp[k] / temp)
+            * conc[i] * conc[j]
+        )
+    return exprs
+
+
+def build(num_rxns, intern):
+    if intern:
+        with interned() as table:
+            return build_mechanism(num_rxns), len(table)
+    return build_mechanism(num_rxns), None
+
+
+def measure(num_rxns, intern):
+    t0 = time.perf_counter()
+    build(num_rxns, intern)
+    t_build = time.perf_counter() - t0
+
+    tracemalloc.start()
+    exprs, num_nodes = build(num_rxns, intern)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    unique = set(exprs)
+    t_hash = time.perf_counter() - t0
+    return t_build, peak, t_hash, len(unique), num_nodes
+
+
+def run_minipyro():
+    num_rxns = 10_000
+    print(f'{num_rxns} synthetic reactions')
+    print('{:>10s} {:>10s} {:>12s} {:>10s} {:>14s} {:>12s}'.format(
+        'interning', 'build [s]', 'peak [MiB]', 'hash [s]',
+        'unique rates', 'table size'
+    ))
+    for intern in [False, True]:
+        t_build, peak, t_hash, num_unique, num_nodes = measure(
+            num_rxns, intern
+        )
+        print(f'{str(intern):>10s} {t_build:>10.3f} {peak/2**20:>12.2f} '
+              f'{t_hash:>10.4f} {num_unique:>14d} {str(num_nodes):>12s}')
+    return
+
+
+if __name__ == '__main__':
+    run_minipyro()
+    exit()
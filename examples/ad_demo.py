@@ -32,7 +32,7 @@ def run_minipyro():
     conc_ad = adiff_np.AutodiffVariable(conc_np, name='concentration')
     rxn_rate = pyro_gas.get_rxn_rate(temp_ad, conc_ad)
     print('R = [{:s}]'.format(
-        ', '.join(['{:.3e}'.format(r) for r in rxn_rate.values])
+        ', '.join(['{:.3e}'.format(r) for r in rxn_rate.values[0]])
     ))
 
     g = rxn_rate.gradient()
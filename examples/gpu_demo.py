@@ -20,7 +20,7 @@ def run_minipyro():
 
     temp = 300 * np.ones((num_x, num_x))
     conc = 0.5 * np.ones((2, num_x, num_x))
-    rate = np.zeros((num_x, num_x))
+    rate = np.zeros((1, num_x, num_x))
     rxn_rate.evaluate(conc, rate, temp)
 
     print(rxn_rate.cuda_code)
@@ -1,3 +1,17 @@
-import minipyro.codegen
-import minipyro.pyro_np
-import minipyro.symbolic
+import importlib
+
+# Submodules load on first attribute access, so that e.g. using adiff_np
+# never imports cantera, mako, loopy or pycuda
+_submodules = (
+    'cache', 'chem_expr', 'codegen', 'profiling', 'pyro_np', 'symbolic'
+)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_submodules))
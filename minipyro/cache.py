@@ -0,0 +1,161 @@
+import os
+import hashlib
+import tempfile
+import py_compile
+import importlib.util
+from functools import lru_cache
+
+
+DEFAULT_MAX_BYTES = 256 * 2**20
+
+
+@lru_cache(maxsize=None)
+def get_version():
+    from importlib.metadata import version, PackageNotFoundError
+    try:
+        pkg_version = version('minipyro')
+    except PackageNotFoundError:
+        pkg_version = 'unknown'
+    # Editable installs change without a version bump, so the package
+    # sources are part of the version too
+    pkg_dir = os.path.dirname(os.path.abspath(__file__))
+    sources = []
+    for dir_path, _, file_names in sorted(os.walk(pkg_dir)):
+        for name in sorted(file_names):
+            if name.endswith('.py'):
+                with open(os.path.join(dir_path, name), 'rb') as fh:
+                    sources.append(fh.read())
+    return pkg_version + '+' + content_hash(*sources)
+
+
+def get_cache_dir(kind):
+    # MINIPYRO_CACHE_DIR overrides the per-user default
+    root = os.environ.get('MINIPYRO_CACHE_DIR')
+    if root is None:
+        root = os.path.join(
+            os.environ.get(
+                'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')
+            ),
+            'minipyro'
+        )
+    cache_dir = os.path.join(root, kind)
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def content_hash(*parts):
+    h = hashlib.sha256()
+    for p in parts:
+        p = p if isinstance(p, bytes) else str(p).encode()
+        # Length-prefix each part so that ('ab', 'c') != ('a', 'bc')
+        h.update(len(p).to_bytes(8, 'little'))
+        h.update(p)
+    return h.hexdigest()
+
+
+# {{{ File operations safe under concurrent writers
+
+def atomic_write(path, data: bytes):
+    # Readers see either no file or the complete file, never a partial one.
+    # Writers racing on the same key write identical content, so the last
+    # os.replace winning is fine.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        # mkstemp creates owner-only files; honour the umask instead
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def touch(path):
+    # Mark as recently used for eviction; another process may have evicted
+    # the entry in the meantime
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def is_in_progress(name):
+    # Temporary files of atomic_write and build directories of other
+    # processes, which are not artifacts yet
+    return name.startswith(tempfile.gettempprefix()) or name.endswith(
+        ('.tmp', '.lock')
+    )
+
+
+def evict(cache_dir, max_bytes=None):
+    # Least-recently-used eviction of completed artifacts, down to
+    # max_bytes
+    if max_bytes is None:
+        max_bytes = int(
+            os.environ.get('MINIPYRO_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        )
+
+    entries = []
+    for dir_path, dir_names, file_names in os.walk(cache_dir):
+        dir_names[:] = [d for d in dir_names if not is_in_progress(d)]
+        for name in file_names:
+            if is_in_progress(name):
+                continue
+            path = os.path.join(dir_path, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+# }}}
+
+
+# {{{ Python modules
+
+def load_module(cache_dir, key):
+    path = os.path.join(cache_dir, f'{key}.py')
+    if not touch(path):
+        return None
+    touch(importlib.util.cache_from_source(path))
+    spec = importlib.util.spec_from_file_location(f'minipyro_{key}', path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except FileNotFoundError:
+        # Evicted between the check and the import
+        return None
+    return module
+
+
+def store_module(cache_dir, key, code_str):
+    path = os.path.join(cache_dir, f'{key}.py')
+    atomic_write(path, code_str.encode())
+    # py_compile also writes the bytecode atomically. Entries are content
+    # addressed and never go stale, so the loader need not check the source
+    # (whose mtime moves on every hit).
+    py_compile.compile(
+        path, cfile=importlib.util.cache_from_source(path), doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+    evict(cache_dir)
+    return load_module(cache_dir, key)
+
+# }}}
@@ -1,15 +1,127 @@
+import os
+import json
+import warnings
 import cantera as ct
 import numpy as np
+from functools import reduce
 from minipyro.symbolic import Variable
 
 
+# {{{ Mechanism input
+
+def get_demo_reactions():
+    rxn = ct.Reaction(
+        # Reactants & Products for M + N -> P + Q
+        {'m': 1, 'n': 1}, {'p': 1, 'q': 1},
+        # Arrhenius coefficients, taken from Reaction 1, San Diego mech
+        {'A': 35127309770106.477, 'b': -0.7, 'Ea': 8590 * ct.gas_constant}
+    )
+    return ['m', 'n', 'p', 'q'], [rxn]
+
+
+def get_mechanism(mech=None, skip_unsupported=False):
+    # Accepts a ct.Solution, a path to a YAML mechanism, or None for the
+    # single-reaction demo mechanism. Reactions without a rate expression
+    # here (e.g. falloff) raise, unless skip_unsupported drops them with a
+    # warning naming their equations; the remaining reactions are
+    # renumbered, so rows no longer line up with Cantera's.
+    if mech is None:
+        return get_demo_reactions()
+    if isinstance(mech, (str, os.PathLike)):
+        mech = ct.Solution(mech)
+    species_names, reactions = mech.species_names, mech.reactions()
+    if skip_unsupported:
+        reactions = get_supported_reactions(species_names, reactions)
+    return species_names, reactions
+
+
+def get_supported_reactions(species_names, reactions):
+    temp = Variable('temperature')
+    conc = Variable('concentration')
+    supported, skipped = [], []
+    for rxn in reactions:
+        try:
+            rxn_rate_expr(rxn, species_names, temp, conc)
+        except (NotImplementedError, ValueError) as err:
+            skipped.append(str(err))
+        else:
+            supported.append(rxn)
+    if skipped:
+        warnings.warn(
+            f'Skipped {len(skipped)} unsupported reactions: '
+            + '; '.join(skipped), stacklevel=3
+        )
+    return supported
+
+
+def get_mechanism_fingerprint(mech=None, skip_unsupported=False):
+    species_names, reactions = get_mechanism(mech, skip_unsupported)
+    return json.dumps(
+        [species_names, [rxn.input_data for rxn in reactions]],
+        sort_keys=True, default=str
+    )
+
+# }}}
+
+
+# {{{ Rate expressions
+
 def arrhenius_expr(rxn: ct.Reaction, temp: Variable):
+    if not isinstance(rxn.rate, ct.ArrheniusRate):
+        raise NotImplementedError(
+            f'Unsupported rate type {rxn.rate.type} '
+            f'in reaction {rxn.equation}'
+        )
     # Nonlinear functions
     exp = Variable('exp')
     log = Variable('log')
-    # Arrhenius parameters
+    # Arrhenius parameters. The prefactor enters through its logarithm.
+    if rxn.rate.pre_exponential_factor <= 0:
+        raise ValueError(
+            f'Non-positive pre-exponential factor '
+            f'{rxn.rate.pre_exponential_factor} in reaction {rxn.equation}'
+        )
     log_a = np.log(rxn.rate.pre_exponential_factor)
     b = rxn.rate.temperature_exponent
     act_temp = -1 * rxn.rate.activation_energy / ct.gas_constant
     # Construct the Arrhenius expression
     return exp(log_a + b * log(temp) + act_temp / temp)
+
+
+def third_body_expr(rxn: ct.Reaction, species_names, conc: Variable):
+    if rxn.third_body.name != 'M':
+        # Explicit collision partner, e.g. H + O2 + AR <=> HO2 + AR
+        return conc[species_names.index(rxn.third_body.name)]
+
+    eff = [
+        rxn.third_body.efficiencies.get(sp, rxn.third_body.default_efficiency)
+        for sp in species_names
+    ]
+    return reduce(lambda a, b: a + b, [
+        conc[i] if e == 1 else e * conc[i]
+        for i, e in enumerate(eff) if e != 0
+    ])
+
+
+def conc_product_expr(rxn: ct.Reaction, species_names, conc: Variable):
+    factors = []
+    for sp, nu in rxn.reactants.items():
+        order = rxn.orders.get(sp, nu)
+        if order != int(order):
+            raise NotImplementedError(
+                f'Non-integer reaction order {order} for {sp} '
+                f'in reaction {rxn.equation}'
+            )
+        factors += int(order) * [conc[species_names.index(sp)]]
+    return reduce(lambda a, b: a * b, factors)
+
+
+def rxn_rate_expr(rxn: ct.Reaction, species_names,
+                  temp: Variable, conc: Variable):
+    # Forward rate of progress; reverse rates are not generated
+    rate = arrhenius_expr(rxn, temp)
+    if rxn.third_body is not None:
+        rate = rate * third_body_expr(rxn, species_names, conc)
+    return rate * conc_product_expr(rxn, species_names, conc)
+
+# }}}
@@ -0,0 +1,15 @@
+import importlib
+
+_submodules = (
+    'c', 'cost', 'cse', 'differentiation', 'fortran', 'mappers', 'python'
+)
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_submodules))
@@ -0,0 +1,220 @@
+import numbers
+import ctypes
+import numpy as np
+from mako.template import Template
+from minipyro.chem_expr import (
+    get_mechanism, arrhenius_expr, rxn_rate_expr
+)
+from minipyro.codegen.mappers import CodeGenerationMapper, _prec
+from minipyro.codegen.cost import get_cost
+from minipyro.codegen.cse import eliminate_common_subexpressions
+from minipyro.codegen.differentiation import get_jacobian
+from minipyro.symbolic import Variable, simplify
+
+
+# {{{ Codegen Mapper
+
+class ThermochemCMapper(CodeGenerationMapper):
+    # Inputs are indexed by the flattened grid index i, with a leading
+    # axis of stride n; CSE temporaries are per-point scalars
+
+    def __init__(self, arrays):
+        super().__init__()
+        self.arrays = arrays
+
+    def map_constant(self, expr):
+        if isinstance(expr, numbers.Integral):
+            return str(int(expr))
+        return repr(float(expr))
+
+    def map_variable(self, expr):
+        if expr.name in self.arrays:
+            return f'{expr.name}[i]'
+        return expr.name
+
+    def map_subscript(self, expr):
+        return f'{expr.a.name}[{expr.i} * n + i]'
+
+    def map_call(self, expr):
+        return '{:s}({:s})'.format(
+            expr.fn_name.name, self.rec(expr.fn_arg, _prec['call'])
+        )
+
+# }}}
+
+
+# {{{ Code template
+
+code_tpl = Template("""
+#include <math.h>
+#include <stdint.h>
+#include <string.h>
+
+%for fn_name, arg_names, cse, rows, zero_rows in functions:
+void ${fn_name}(
+    const int64_t n,
+%for name in arg_names:
+    const double *restrict ${name},
+%endfor
+    double *restrict out)
+{
+%if zero_rows:
+    static const int32_t zero_rows[${len(zero_rows)}] = {
+        ${', '.join(map(str, zero_rows))}
+    };
+    for (int k = 0; k < ${len(zero_rows)}; ++k)
+        memset(out + zero_rows[k] * n, 0, n * sizeof(double));
+
+%endif
+    #pragma omp parallel for simd schedule(static)
+    for (int64_t i = 0; i < n; ++i)
+    {
+%for name, expr in cse.assignments:
+        const double ${name} = ${cgm.rec(expr)};
+%endfor
+%for k, expr in zip(rows, cse.exprs):
+        out[${k} * n + i] = ${cgm.rec(expr)};
+%endfor
+    }
+}
+
+%endfor
+""", strict_undefined=True)
+
+# }}}
+
+
+# {{{ Thermochemistry
+
+class NativeThermochemistry:
+    # Same API as the generated Python class. Arguments that already are
+    # C-contiguous float64 arrays are passed to the compiled loops as is,
+    # and out may be given to reuse an output buffer.
+
+    lib_path = None
+    costs = {}
+
+    def __init__(self):
+        lib = ctypes.CDLL(self.lib_path)
+        ptr = np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS')
+        self.fns = {}
+        for fn_name, num_args in [('get_fwd_rate_coefficients', 1),
+                                  ('get_rxn_rate', 2),
+                                  ('get_rxn_rate_jacobian', 2)]:
+            fn = getattr(lib, fn_name)
+            fn.argtypes = [ctypes.c_int64] + [ptr] * (num_args + 1)
+            fn.restype = None
+            self.fns[fn_name] = fn
+
+    @classmethod
+    def get_cost(cls, method):
+        # Static operation and memory traffic counts per grid point
+        return cls.costs[method]
+
+    def _call(self, fn_name, out_axes, temperature, *args, out=None):
+        # Taken first, ascontiguousarray makes 0-d arrays 1-d. A scalar
+        # grid is one point, and out of shape out_axes has its layout.
+        grid_shape = np.shape(temperature)
+        temperature = np.ascontiguousarray(temperature, dtype=np.float64)
+        args = [np.ascontiguousarray(a, dtype=np.float64) for a in args]
+        for a in args:
+            if a.shape != (self.num_species,) + grid_shape:
+                raise ValueError(
+                    f'concentration has shape {a.shape}, expected '
+                    f'{(self.num_species,) + grid_shape}'
+                )
+        out_shape = out_axes + grid_shape
+        if out is None:
+            out = np.empty(out_shape)
+        elif (out.shape != out_shape or out.dtype != np.float64
+              or not out.flags.c_contiguous):
+            raise ValueError(
+                f'out must be a C-contiguous float64 array of shape {out_shape}'
+            )
+        self.fns[fn_name](temperature.size, temperature, *args, out)
+        return out
+
+    def get_fwd_rate_coefficients(self, temperature, out=None):
+        return self._call(
+            'get_fwd_rate_coefficients', (self.num_reactions,), temperature,
+            out=out
+        )
+
+    def get_rxn_rate(self, temperature, concentration, out=None):
+        return self._call(
+            'get_rxn_rate', (self.num_reactions,), temperature, concentration,
+            out=out
+        )
+
+    def get_rxn_rate_jacobian(self, temperature, concentration, out=None):
+        return self._call(
+            'get_rxn_rate_jacobian',
+            (self.num_reactions, self.num_species + 1), temperature,
+            concentration, out=out
+        )
+
+# }}}
+
+
+def _is_zero(expr):
+    return isinstance(expr, numbers.Number) and expr == 0
+
+
+def generate_code(mech=None, skip_unsupported=False):
+
+    species_names, reactions = get_mechanism(mech, skip_unsupported)
+
+    temp = Variable('temperature')
+    conc = Variable('concentration')
+    coeff_exprs = simplify([arrhenius_expr(rxn, temp) for rxn in reactions])
+    rate_coeffs = eliminate_common_subexpressions(coeff_exprs)
+    rate_exprs = simplify([
+        rxn_rate_expr(rxn, species_names, temp, conc) for rxn in reactions
+    ])
+    rxn_rates = eliminate_common_subexpressions(rate_exprs)
+    # Vanishing Jacobian entries are cleared outside the point loop, which
+    # would otherwise be mostly stores of zeros
+    wrt = [temp] + [conc[k] for k in range(len(species_names))]
+    jac_flat = simplify([
+        expr for row in get_jacobian(rate_exprs, wrt) for expr in row
+    ])
+    jac_rows = [k for k, expr in enumerate(jac_flat) if not _is_zero(expr)]
+    jacobian = eliminate_common_subexpressions(
+        [jac_flat[k] for k in jac_rows]
+    )
+    jac_zero_rows = [k for k, expr in enumerate(jac_flat) if _is_zero(expr)]
+
+    cgm = ThermochemCMapper(arrays=('temperature', 'concentration'))
+    code_str = code_tpl.render(
+        functions=[
+            ('get_fwd_rate_coefficients', ['temperature'], rate_coeffs,
+             range(len(reactions)), []),
+            ('get_rxn_rate', ['temperature', 'concentration'], rxn_rates,
+             range(len(reactions)), []),
+            ('get_rxn_rate_jacobian', ['temperature', 'concentration'],
+             jacobian, jac_rows, jac_zero_rows),
+        ],
+        cgm=cgm,
+    )
+    costs = {
+        'get_fwd_rate_coefficients': get_cost(coeff_exprs),
+        'get_rxn_rate': get_cost(rate_exprs),
+        'get_rxn_rate_jacobian': get_cost(jac_flat),
+    }
+    return species_names, len(reactions), code_str, costs
+
+
+def get_thermochem_class(mech=None, skip_unsupported=False):
+    # The library is compiled now, and cached by the hash of its source
+    from minipyro.pyro_np.host import build_library
+    species_names, num_reactions, code_str, costs = generate_code(
+        mech, skip_unsupported
+    )
+    return type('Thermochemistry', (NativeThermochemistry,), {
+        'num_species': len(species_names),
+        'num_reactions': num_reactions,
+        'species_names': tuple(species_names),
+        'lib_path': build_library(code_str),
+        'c_code': code_str,
+        'costs': costs,
+    })
@@ -0,0 +1,161 @@
+from collections import Counter
+from minipyro.codegen.mappers import Mapper
+
+
+# Rough cost of one exp or log in floating-point operations, as libm
+# evaluates them with a range reduction and a polynomial
+TRANSCENDENTAL_FLOPS = 20
+
+
+# {{{ Cost report
+
+class Cost:
+    # Work per grid point of a kernel: arithmetic operations, transcendental
+    # calls by name, and the distinct inputs (e.g. temperature,
+    # concentration[3]) read and outputs written, itemsize bytes each
+
+    def __init__(self, adds=0, muls=0, divs=0, transcendentals=None,
+                 reads=(), writes=0, itemsize=8):
+        self.adds = adds
+        self.muls = muls
+        self.divs = divs
+        self.transcendentals = dict(transcendentals or {})
+        self.reads = tuple(sorted(reads))
+        self.writes = writes
+        self.itemsize = itemsize
+
+    @property
+    def flops(self):
+        return self.adds + self.muls + self.divs
+
+    @property
+    def num_transcendentals(self):
+        return sum(self.transcendentals.values())
+
+    @property
+    def bytes(self):
+        return self.itemsize * (len(self.reads) + self.writes)
+
+    def get_weighted_flops(self, transcendental_flops=TRANSCENDENTAL_FLOPS):
+        return self.flops + transcendental_flops * self.num_transcendentals
+
+    def get_intensity(self, transcendental_flops=TRANSCENDENTAL_FLOPS):
+        # Floating-point operations per byte of compulsory memory traffic
+        return self.get_weighted_flops(transcendental_flops) / self.bytes
+
+    def roofline(self, bandwidth, peak_flops,
+                 transcendental_flops=TRANSCENDENTAL_FLOPS):
+        # Attainable rate for a machine with bandwidth in bytes/s and
+        # peak_flops in operations/s, assuming every input is read once and
+        # every output written once per point, and no other traffic
+        flops = self.get_weighted_flops(transcendental_flops)
+        t_mem = self.bytes / bandwidth
+        t_flop = flops / peak_flops
+        time_per_point = max(t_mem, t_flop)
+        return {
+            'intensity': flops / self.bytes,
+            'ridge_point': peak_flops / bandwidth,
+            'bound': 'memory' if t_mem >= t_flop else 'compute',
+            'attainable_flops': flops / time_per_point,
+            'time_per_point': time_per_point,
+            'points_per_second': 1 / time_per_point,
+        }
+
+    def as_dict(self):
+        return {
+            'adds': self.adds, 'muls': self.muls, 'divs': self.divs,
+            'transcendentals': dict(self.transcendentals),
+            'reads': list(self.reads), 'writes': self.writes,
+            'itemsize': self.itemsize,
+        }
+
+    def __repr__(self):
+        return (f'Cost(flops={self.flops}, transcendentals='
+                f'{self.num_transcendentals}, reads={len(self.reads)}, '
+                f'writes={self.writes}, bytes={self.bytes})')
+
+# }}}
+
+
+# {{{ Mappers
+
+class CostMapper(Mapper):
+    # Counts every unique node once, as CSE'd code computes it. Subscripts
+    # are reads of one row, their array is not read as a whole.
+
+    def __init__(self, itemsize=8):
+        super().__init__()
+        self.itemsize = itemsize
+        self.ops = Counter()
+        self.transcendentals = Counter()
+        self.reads = set()
+
+    def get_expr(self, node):
+        return node
+
+    def get_children(self, node):
+        if self.get_mapper_method(node) == 'map_subscript':
+            return ()
+        return super().get_children(node)
+
+    def map_variable(self, node):
+        self.reads.add(self.get_expr(node).name)
+
+    def map_subscript(self, node):
+        expr = self.get_expr(node)
+        self.reads.add(f'{expr.a.name}[{expr.i}]')
+
+    def map_sum(self, node):
+        self.ops['adds'] += len(self.get_expr(node).children) - 1
+
+    def map_product(self, node):
+        self.ops['muls'] += len(self.get_expr(node).children) - 1
+
+    def map_quotient(self, node):
+        self.ops['divs'] += 1
+
+    def map_call(self, node):
+        fn_name = self.get_expr(node).fn_name
+        self.transcendentals[getattr(fn_name, 'name', fn_name)] += 1
+
+    def map_stack(self, node):
+        pass
+
+    def get_cost(self, writes):
+        return Cost(
+            transcendentals=self.transcendentals, reads=self.reads,
+            writes=writes, itemsize=self.itemsize, **self.ops
+        )
+
+
+class LazyCostMapper(CostMapper):
+    # LazyArrays hash by identity: nodes are counted as the graph was built
+
+    def get_expr(self, ary):
+        return ary.expr
+
+    def get_mapper_method(self, ary):
+        return ary.expr.mapper_method
+
+    def get_children(self, ary):
+        from minipyro.pyro_np.lazy_np import get_array_children
+        return get_array_children(ary)
+
+
+def get_cost(exprs, itemsize=8):
+    # Cost per point of evaluating exprs, one output each
+    mapper = CostMapper(itemsize)
+    for e in exprs:
+        mapper.rec(e)
+    return mapper.get_cost(writes=len(exprs))
+
+
+def get_array_cost(ary, itemsize=8):
+    # Cost per grid point of a lazy_np graph, one output per stacked row
+    from minipyro.symbolic import Stack
+    mapper = LazyCostMapper(itemsize)
+    mapper.rec(ary)
+    writes = len(ary.expr.children) if isinstance(ary.expr, Stack) else 1
+    return mapper.get_cost(writes=writes)
+
+# }}}
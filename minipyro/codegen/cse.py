@@ -0,0 +1,121 @@
+import numbers
+from collections import Counter
+from minipyro.symbolic import (
+    Variable, Sum, Product, Quotient, Call, walk
+)
+from minipyro.codegen.mappers import IdentityMapper
+
+
+# {{{ Operation counts
+
+def count_ops(exprs):
+    ops = Counter({'exp': 0, 'log': 0, 'div': 0})
+    for expr in walk(exprs):
+        if isinstance(expr, Call):
+            fn_name = getattr(expr.fn_name, 'name', expr.fn_name)
+            if fn_name in ops:
+                ops[fn_name] += 1
+        elif isinstance(expr, Quotient):
+            ops['div'] += 1
+    return ops
+
+# }}}
+
+
+# {{{ Common subexpression elimination
+
+def normalize_quotient(expr):
+    # c / x -> c * (1 / x), so that the reciprocal can be shared
+    if (isinstance(expr, Quotient)
+            and isinstance(expr.num, numbers.Number) and expr.num != 1
+            and not isinstance(expr.den, numbers.Number)):
+        return Product((expr.num, Quotient(1, expr.den)))
+    return expr
+
+
+class NormalizationMapper(IdentityMapper):
+
+    def map_quotient(self, expr):
+        return normalize_quotient(self.map_node(expr))
+
+
+class HoistingMapper(IdentityMapper):
+
+    def __init__(self, counts, prefix):
+        super().__init__()
+        self.counts = counts
+        self.prefix = prefix
+        self.hoisted = []
+
+    def map_node(self, expr):
+        new_expr = super().map_node(expr)
+        if self.counts[expr] > 1 and isinstance(
+                expr, (Sum, Product, Quotient, Call)):
+            self.hoisted.append(
+                (f'_{self.prefix}_tmp{len(self.hoisted)}', new_expr)
+            )
+            return Variable(self.hoisted[-1][0])
+        return new_expr
+
+    map_sum = map_product = map_quotient = map_call = map_node
+
+
+class SubstitutionMapper(IdentityMapper):
+
+    def __init__(self, subst):
+        super().__init__()
+        self.subst = subst
+
+    def map_variable(self, expr):
+        return self.subst.get(expr.name, expr)
+
+
+class CommonSubexpressions:
+
+    def __init__(self, assignments, exprs, savings):
+        self.assignments = assignments
+        self.exprs = exprs
+        self.savings = savings
+
+
+def eliminate_common_subexpressions(exprs, prefix='cse'):
+    exprs_in = list(exprs)
+    normalize = NormalizationMapper()
+    exprs = [normalize.rec(e) for e in exprs_in]
+    counts = Counter(
+        e for e in walk(exprs) if not isinstance(e, numbers.Number)
+    )
+
+    # Hoist every repeated arithmetic subtree
+    hoist = HoistingMapper(counts, prefix)
+    exprs = [hoist.rec(e) for e in exprs]
+    hoisted = hoist.hoisted
+
+    # {{{ Inline temporaries used only once, then name the rest
+
+    uses = Counter(
+        e.name for e in walk(exprs + [rhs for _, rhs in hoisted])
+        if isinstance(e, Variable)
+    )
+    subst = {}
+    substitute = SubstitutionMapper(subst)
+
+    assignments = []
+    for tmp_name, rhs in hoisted:
+        rhs = substitute.rec(rhs)
+        if uses[tmp_name] > 1:
+            name = f'{prefix}{len(assignments)}'
+            assignments.append((name, rhs))
+            subst[tmp_name] = Variable(name)
+        else:
+            subst[tmp_name] = rhs
+    exprs = [substitute.rec(e) for e in exprs]
+
+    # }}}
+
+    ops_before = count_ops(exprs_in)
+    ops_after = count_ops(exprs + [rhs for _, rhs in assignments])
+    savings = {op: ops_before[op] - ops_after[op] for op in ops_before}
+    return CommonSubexpressions(assignments, exprs, savings)
+
+# }}}
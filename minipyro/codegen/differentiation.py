@@ -0,0 +1,97 @@
+import numbers
+from minipyro.symbolic import Sum, Product, Quotient
+from minipyro.codegen.mappers import Mapper
+
+
+# {{{ Builders that drop zero terms and unit factors
+
+def _sum(terms):
+    terms = tuple(t for t in terms if not _is_const(t, 0))
+    if not terms:
+        return 0
+    return terms[0] if len(terms) == 1 else Sum(terms)
+
+
+def _product(factors):
+    if any(_is_const(f, 0) for f in factors):
+        return 0
+    factors = tuple(f for f in factors if not _is_const(f, 1))
+    if not factors:
+        return 1
+    return factors[0] if len(factors) == 1 else Product(factors)
+
+
+def _is_const(expr, value):
+    return isinstance(expr, numbers.Number) and expr == value
+
+# }}}
+
+
+# {{{ Differentiation
+
+class DifferentiationMapper(Mapper):
+    # Maps each expression to its derivative with respect to wrt, a
+    # Variable or a Subscript such as concentration[3]. Nodes are compared
+    # structurally, and derivatives of shared subtrees are computed once.
+    # Results reuse the original subtrees (e.g. d exp(u) = exp(u) du), so
+    # CSE can share them with the function itself.
+
+    def __init__(self, wrt):
+        super().__init__()
+        self.wrt = wrt
+
+    def map_constant(self, expr):
+        return 0
+
+    def map_variable(self, expr):
+        return 1 if expr == self.wrt else 0
+
+    map_subscript = map_variable
+
+    def map_sum(self, expr):
+        return _sum([self.rec(c) for c in expr.children])
+
+    def map_product(self, expr):
+        # Product rule, one term per factor that depends on wrt
+        terms = []
+        for k, c in enumerate(expr.children):
+            dc = self.rec(c)
+            if not _is_const(dc, 0):
+                terms.append(_product(
+                    expr.children[:k] + (dc,) + expr.children[k+1:]
+                ))
+        return _sum(terms)
+
+    def map_quotient(self, expr):
+        # d(n / d) = dn / d - n dd / (d d)
+        dn, dd = self.rec(expr.num), self.rec(expr.den)
+        terms = []
+        if not _is_const(dn, 0):
+            terms.append(Quotient(dn, expr.den))
+        if not _is_const(dd, 0):
+            terms.append(Quotient(
+                _product((-1, expr.num, dd)), Product((expr.den, expr.den))
+            ))
+        return _sum(terms)
+
+    def map_call(self, expr):
+        du = self.rec(expr.fn_arg)
+        if _is_const(du, 0):
+            return 0
+        fn_name = getattr(expr.fn_name, 'name', expr.fn_name)
+        if fn_name == 'exp':
+            return _product((expr, du))
+        if fn_name == 'log':
+            return Quotient(du, expr.fn_arg)
+        raise NotImplementedError(f'Cannot differentiate {fn_name}')
+
+
+def get_jacobian(exprs, wrt):
+    # Dense rows d(exprs[i])/d(wrt[j]); entries that vanish are the number 0
+    columns = []
+    for w in wrt:
+        mapper = DifferentiationMapper(w)
+        columns.append([mapper.rec(e) for e in exprs])
+    return [list(row) for row in zip(*columns)]
+
+# }}}
@@ -1,74 +1,232 @@
-import cantera as ct
+import numbers
 from mako.template import Template
-from minipyro.chem_expr import arrhenius_expr
-from minipyro.codegen.mappers import CodeGenerationMapper
-from minipyro.symbolic import Variable
+from minipyro.chem_expr import get_mechanism, rxn_rate_expr
+from minipyro.codegen.mappers import CodeGenerationMapper, _prec
+from minipyro.codegen.cse import eliminate_common_subexpressions
+from minipyro.codegen.differentiation import get_jacobian
+from minipyro.symbolic import Variable, simplify
+
+
+# Free-form lines may hold at most 132 characters
+MAX_LINE_LENGTH = 100
 
 
 # {{{ Codegen Mapper
 
 class FortranMapper(CodeGenerationMapper):
-
-    def map_subscript(self, expr, prec):
+    # In vectorized mode the names in arrays are indexed by the cell
+    # index i, everything else (CSE temporaries) is a per-cell scalar
+
+    def __init__(self, arrays=()):
+        super().__init__()
+        self.arrays = arrays
+
+    def map_constant(self, expr):
+        # Real literals are double precision, and negative ones are
+        # parenthesized since Fortran disallows e.g. 'a * -b'
+        if isinstance(expr, numbers.Integral):
+            expr_str = str(int(expr))
+        else:
+            expr_str = str(float(expr)) + '_dp'
+        return f'({expr_str})' if expr < 0 else expr_str
+
+    def map_variable(self, expr):
+        if expr.name in self.arrays:
+            return f'{expr.name}(i)'
+        return expr.name
+
+    def map_subscript(self, expr):
         ids = expr.i.name if isinstance(expr.i, Variable) else str(expr.i + 1)
-        return '{:s}({:s})'.format(self.rec(expr.a, self.prec['sub']), ids)
+        if expr.a.name in self.arrays:
+            return f'{expr.a.name}(i, {ids})'
+        return '{:s}({:s})'.format(self.rec(expr.a, _prec['sub']), ids)
 
-    def map_call(self, expr, prec):
+    def map_call(self, expr):
         return '{:s}({:s})'.format(
-            self.rec(expr.fn_name, self.prec['call']),
-            self.rec(expr.fn_arg, self.prec['call'])
+            expr.fn_name.name, self.rec(expr.fn_arg, _prec['call'])
         )
 
+
+def wrap_lines(code_str, width=MAX_LINE_LENGTH):
+    # Breaks long statements at spaces, with '&' continuations
+    lines = []
+    for line in code_str.splitlines():
+        if len(line) <= width or line.lstrip().startswith('!'):
+            lines.append(line)
+            continue
+        indent = line[:len(line) - len(line.lstrip())]
+        words = line.split()
+        current = indent + words[0]
+        for word in words[1:]:
+            if len(current) + len(word) + 3 > width:
+                lines.append(current + ' &')
+                current = indent + '    & ' + word
+            else:
+                current += ' ' + word
+        lines.append(current)
+    return '\n'.join(lines)
+
 # }}}
 
 
 # {{{ Code template
 
+# Scalar subroutines handle one cell. Vectorized ones take contiguous
+# arrays over a block of cells, cells first: NumPy's (num_species, n)
+# concentration and (num_reactions, n) rates have the same memory layout
+# as Fortran's concentration(n, num_species) and rxn_rate(n, num_reactions).
 code_tpl = Template("""
-
 module Thermochemistry
 
+    use, intrinsic :: iso_fortran_env, only: dp => real64
+
     implicit none
 
+    integer, parameter :: num_species = ${num_species}
+    integer, parameter :: num_reactions = ${len(rxn_rates.exprs)}
+
 contains
 
+%if vectorized:
+    subroutine get_rxn_rate(temperature, concentration, rxn_rate)
+
+        real(dp), intent(in), contiguous :: temperature(:)
+        real(dp), intent(in), contiguous :: concentration(:, :)
+        real(dp), intent(out), contiguous :: rxn_rate(:, :)
+        integer :: i
+
+        !$omp parallel do simd
+        do i = 1, size(temperature)
+            block
+%for name, _ in rxn_rates.assignments:
+                real(dp) :: ${name}
+%endfor
+
+%for name, expr in rxn_rates.assignments:
+                ${name} = ${cgm.rec(expr)}
+%endfor
+%for k, expr in enumerate(rxn_rates.exprs):
+                rxn_rate(i, ${k + 1}) = ${cgm.rec(expr)}
+%endfor
+            end block
+        end do
+        !$omp end parallel do simd
+
+    end subroutine
+
+    subroutine get_rxn_rate_jacobian(temperature, concentration, jac)
+
+        ! jac(i, 1, r) is d(rxn_rate(i, r))/d(temperature(i)) and
+        ! jac(i, k + 1, r) is d(rxn_rate(i, r))/d(concentration(i, k))
+        real(dp), intent(in), contiguous :: temperature(:)
+        real(dp), intent(in), contiguous :: concentration(:, :)
+        real(dp), intent(out), contiguous :: jac(:, :, :)
+        integer :: i
+
+        jac = 0
+        !$omp parallel do simd
+        do i = 1, size(temperature)
+            block
+%for name, _ in jacobian.assignments:
+                real(dp) :: ${name}
+%endfor
+
+%for name, expr in jacobian.assignments:
+                ${name} = ${cgm.rec(expr)}
+%endfor
+%for (r, c), expr in zip(jac_entries, jacobian.exprs):
+                jac(i, ${c + 1}, ${r + 1}) = ${cgm.rec(expr)}
+%endfor
+            end block
+        end do
+        !$omp end parallel do simd
+
+    end subroutine
+%else:
     subroutine get_rxn_rate(temperature, concentration, rxn_rate)
 
         real(dp), intent(in) :: temperature
-        real(dp), intent(in) :: concentration(2)
-        real(dp), intent(out) :: rxn_rate
+        real(dp), intent(in) :: concentration(num_species)
+        real(dp), intent(out) :: rxn_rate(num_reactions)
+%for name, _ in rxn_rates.assignments:
+        real(dp) :: ${name}
+%endfor
+
+%for name, expr in rxn_rates.assignments:
+        ${name} = ${cgm.rec(expr)}
+%endfor
+%for k, expr in enumerate(rxn_rates.exprs):
+        rxn_rate(${k + 1}) = ${cgm.rec(expr)}
+%endfor
 
-        real(dp) :: k, conc_product
+    end subroutine
+
+    subroutine get_rxn_rate_jacobian(temperature, concentration, jac)
 
-        k = ${cgm.rec(arrhenius_expr(rxn, Variable("temperature")))}
-        conc_product = ${cgm.rec(conc_product)}
-        rxn_rate = k * conc_product
+        ! jac(r, 1) is d(rxn_rate(r))/d(temperature), jac(r, k + 1) is
+        ! d(rxn_rate(r))/d(concentration(k))
+        real(dp), intent(in) :: temperature
+        real(dp), intent(in) :: concentration(num_species)
+        real(dp), intent(out) :: jac(num_reactions, num_species + 1)
+%for name, _ in jacobian.assignments:
+        real(dp) :: ${name}
+%endfor
+
+%for name, expr in jacobian.assignments:
+        ${name} = ${cgm.rec(expr)}
+%endfor
+        jac = 0
+%for (r, c), expr in zip(jac_entries, jacobian.exprs):
+        jac(${r + 1}, ${c + 1}) = ${cgm.rec(expr)}
+%endfor
 
     end subroutine
+%endif
+
+end module Thermochemistry
 """, strict_undefined=True)
 
 # }}}
 
 
-def get_thermochem_class(write_path):
+def generate_code(mech=None, vectorized=False, skip_unsupported=False):
 
-    rxn = ct.Reaction(
-        # Reactants & Products for M + N -> P + Q
-        {'m': 1, 'n': 1}, {'p': 1, 'q': 1},
-        # Arrhenius coefficients, taken from Reaction 1, San Diego mech
-        {'A': 35127309770106.477, 'b': -0.7, 'Ea': 8590 * ct.gas_constant}
-    )
+    species_names, reactions = get_mechanism(mech, skip_unsupported)
 
+    temp = Variable('temperature')
     conc = Variable('concentration')
-    conc_product = conc[0] * conc[1]
-
-    cgm = FortranMapper()
-    code_str = code_tpl.render(
-        Variable=Variable,
-        arrhenius_expr=arrhenius_expr,
-        conc_product=conc_product,
-        rxn=rxn,
-        cgm=cgm,
+    rate_exprs = simplify([
+        rxn_rate_expr(rxn, species_names, temp, conc) for rxn in reactions
+    ])
+    rxn_rates = eliminate_common_subexpressions(rate_exprs)
+
+    # Only the nonzero Jacobian entries are assigned
+    wrt = [temp] + [conc[k] for k in range(len(species_names))]
+    jac_entries, jac_exprs = [], []
+    jac_flat = simplify([
+        expr for row in get_jacobian(rate_exprs, wrt) for expr in row
+    ])
+    for k, expr in enumerate(jac_flat):
+        if not (isinstance(expr, numbers.Number) and expr == 0):
+            jac_entries.append(divmod(k, len(wrt)))
+            jac_exprs.append(expr)
+    jacobian = eliminate_common_subexpressions(jac_exprs)
+
+    cgm = FortranMapper(
+        arrays=('temperature', 'concentration') if vectorized else ()
     )
+    return wrap_lines(code_tpl.render(
+        num_species=len(species_names),
+        rxn_rates=rxn_rates,
+        jac_entries=jac_entries,
+        jacobian=jacobian,
+        vectorized=vectorized,
+        cgm=cgm,
+    ))
+
+
+def get_thermochem_class(write_path, mech=None, vectorized=False,
+                         skip_unsupported=False):
+    code_str = generate_code(mech, vectorized, skip_unsupported)
     with open(write_path + 'demo_codegen.f90', 'w') as fh:
         print(code_str, file=fh)
@@ -1,8 +1,15 @@
-from minipyro.symbolic import Variable
+import numbers
+from minipyro.symbolic import Variable, get_children, rebuild
 
 
 _prec = {'var': 0, 'call': 1, 'sum': 2, 'mul': 3, 'div': 4, 'sub': 5}
 
+# Binding strength of each node type; the rest never need parentheses
+_node_prec = {
+    'map_sum': _prec['sum'], 'map_product': _prec['mul'],
+    'map_quotient': _prec['div']
+}
+
 
 def parenthesize(expr_str, prec_expr, prec):
     if prec and prec > prec_expr:
@@ -11,45 +18,102 @@ def parenthesize(expr_str, prec_expr, prec):
         return expr_str
 
 
-# {{{ Code generation
+# {{{ Traversal
+
+class Mapper:
+    # Maps every unique node exactly once, children before parents, using
+    # an explicit stack. By the time a map_* method runs, self.rec on any
+    # of its children is a cache lookup, so deep trees never recurse.
+
+    def __init__(self):
+        self.cache = {}
 
-class CodeGenerationMapper:
+    def get_mapper_method(self, expr):
+        return expr.mapper_method
+
+    def get_children(self, expr):
+        return get_children(expr)
+
+    def map_constant(self, expr):
+        return expr
 
     def rec(self, expr, *args):
-        import numbers
         if isinstance(expr, numbers.Number):
-            return f'{expr}'
-        if args:
-            return getattr(self, expr.mapper_method)(expr, *args)
-        else:
-            return getattr(self, expr.mapper_method)(expr, None)
+            return self.map_constant(expr)
+        try:
+            return self.cache[expr]
+        except KeyError:
+            self.traverse(expr)
+            return self.cache[expr]
+
+    def traverse(self, expr):
+        stack = [(expr, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node in self.cache:
+                continue
+            if children_done:
+                self.cache[node] = getattr(
+                    self, self.get_mapper_method(node)
+                )(node)
+                continue
+            stack.append((node, True))
+            stack.extend(
+                (c, False) for c in self.get_children(node)
+                if not isinstance(c, numbers.Number) and c not in self.cache
+            )
+
+
+class IdentityMapper(Mapper):
+    # Rebuilds each node from its mapped children; passes override the
+    # node types they rewrite
+
+    def map_node(self, expr):
+        return rebuild(expr, [self.rec(c) for c in get_children(expr)])
+
+    map_variable = map_sum = map_product = map_quotient = map_node
+    map_call = map_subscript = map_stack = map_node
 
-    def map_variable(self, expr, prec):
-        return expr.name
+# }}}
 
-    def map_sum(self, expr, prec):
-        return parenthesize(
-            ' + '.join([self.rec(c, _prec['sum']) for c in expr.children]),
-            _prec['sum'], prec)
 
-    def map_product(self, expr, prec):
-        return parenthesize(
-            ' * '.join([self.rec(c, _prec['mul']) for c in expr.children]),
-            _prec['mul'], prec)
+# {{{ Code generation
+
+class CodeGenerationMapper(Mapper):
+
+    def map_constant(self, expr):
+        return f'{expr}'
 
-    def map_quotient(self, expr, prec):
+    def rec(self, expr, prec=None):
+        expr_str = super().rec(expr)
+        if isinstance(expr, numbers.Number):
+            return expr_str
         return parenthesize(
-            ' / '.join([
-                self.rec(expr.num), self.rec(expr.den)
-            ]),
-            _prec['div'], prec
+            expr_str, _node_prec.get(self.get_mapper_method(expr), _prec['sub']),
+            prec
         )
 
-    def map_subscript(self, expr, prec):
+    def map_variable(self, expr):
+        return expr.name
+
+    def map_sum(self, expr):
+        return ' + '.join([self.rec(c, _prec['sum']) for c in expr.children])
+
+    def map_product(self, expr):
+        return ' * '.join([self.rec(c, _prec['mul']) for c in expr.children])
+
+    def map_quotient(self, expr):
+        # The denominator binds tighter, a / (b / c) keeps its parentheses
+        return ' / '.join([
+            self.rec(expr.num, _prec['div']),
+            self.rec(expr.den, _prec['div'] + 1)
+        ])
+
+    def map_subscript(self, expr):
         ids = expr.i.name if isinstance(expr.i, Variable) else str(expr.i)
         return '{:s}[{:s}]'.format(self.rec(expr.a, _prec['sub']), ids)
 
-    def map_call(self, expr, prec):
+    def map_call(self, expr):
         return 'self.pyro_np.{:s}({:s})'.format(
             self.rec(expr.fn_name, _prec['call']),
             self.rec(expr.fn_arg, _prec['call'])
@@ -60,49 +124,61 @@ class CodeGenerationMapper:
 
 # {{{
 
-class LoopyMapper:
+class LoopyMapper(CodeGenerationMapper):
+    # dtype='float32' prints float constants as float literals, which keep
+    # the arithmetic in single precision. With mixed, call arguments are
+    # printed as for float64, so that C promotes them and exp and log run
+    # in double precision.
     prec = {'var': 0, 'call': 1, 'sum': 2, 'mul': 3, 'div': 4, 'sub': 5}
 
-    def rec(self, ary, *args):
-        import numbers
-        if isinstance(ary, numbers.Number):
-            return f'{ary}'
-        if args:
-            return getattr(self, ary.expr.mapper_method)(ary, *args)
-        else:
-            return getattr(self, ary.expr.mapper_method)(ary, None)
-
-    def map_sum(self, ary, prec):
-        return parenthesize(
-            ' + '.join([
-                self.rec(c, prec) for c in ary.expr.children
-            ]), _prec['sum'], prec)
-
-    def map_product(self, ary, prec):
-        return parenthesize(
-            ' * '.join([
-                self.rec(c, prec) for c in ary.expr.children
-            ]), _prec['mul'], prec)
-
-    def map_quotient(self, ary, prec):
-        return parenthesize(
-            ' / '.join([
-                self.rec(ary.expr.num, prec), self.rec(ary.expr.den, prec)
-            ]), _prec['div'], prec)
-
-    def map_subscript(self, ary, prec):
+    def __init__(self, dtype='float64', mixed=False):
+        super().__init__()
+        self.dtype = dtype
+        self.call_arg_mapper = LoopyMapper() if mixed else self
+
+    def map_constant(self, expr):
+        if self.dtype == 'float32' and isinstance(expr, float):
+            return f'{expr!r}f'
+        return f'{expr}'
+
+    def get_mapper_method(self, ary):
+        return ary.expr.mapper_method
+
+    def get_children(self, ary):
+        # Subscripted placeholders are printed by name, not mapped
+        if ary.expr.mapper_method == 'map_subscript':
+            return ()
+        return get_children(ary.expr)
+
+    def map_sum(self, ary):
+        return ' + '.join([
+            self.rec(c, _prec['sum']) for c in ary.expr.children
+        ])
+
+    def map_product(self, ary):
+        return ' * '.join([
+            self.rec(c, _prec['mul']) for c in ary.expr.children
+        ])
+
+    def map_quotient(self, ary):
+        return ' / '.join([
+            self.rec(ary.expr.num, _prec['div']),
+            self.rec(ary.expr.den, _prec['div'] + 1)
+        ])
+
+    def map_subscript(self, ary):
         dim = len(ary.shape)
         idx = (str(ary.expr.i),) + tuple(f'i{i}' for i in range(dim))
         return ary.expr.a.name + '[{:s}]'.format(', '.join([i for i in idx]))
 
-    def map_variable(self, ary, prec):
+    def map_variable(self, ary):
         dim = len(ary.shape)
         idx = tuple(f'i{i}' for i in range(dim))
         return ary.name + '[{:s}]'.format(', '.join([i for i in idx]))
 
-    def map_call(self, ary, prec):
+    def map_call(self, ary):
         return ary.expr.fn_name + '({:s})'.format(
-            self.rec(ary.expr.fn_arg, _prec['call'])
+            self.call_arg_mapper.rec(ary.expr.fn_arg, _prec['call'])
         )
 
 # }}}
@@ -1,48 +1,494 @@
-import cantera as ct
-from mako.template import Template
-from minipyro.chem_expr import arrhenius_expr
-from minipyro.symbolic import Variable
+import os
+import numbers
+from collections import Counter
+from minipyro import cache
+from minipyro.symbolic import (
+    Variable, Sum, Product, Quotient, Call, get_children, simplify
+)
 from minipyro.codegen.mappers import CodeGenerationMapper
+from minipyro.codegen.cse import (
+    NormalizationMapper, eliminate_common_subexpressions
+)
+from minipyro.codegen.cost import get_cost
+from minipyro.codegen.differentiation import get_jacobian
 
 
-code_tpl = Template("""
+# cantera and mako are only imported when code is actually generated, so
+# that loading a cached class stays cheap
+code_tpl_str = """
 import numpy as np
 
 
 class Thermochemistry:
 
+    num_species = ${len(species_names)}
+    num_reactions = ${len(rate_coeffs.exprs)}
+    species_names = ${repr(tuple(species_names))}
+    cse_savings = ${repr(cse_savings)}
+    costs = ${repr(costs)}
+    dtype = np.${dtype}
+
     def __init__(self, pyro_np=np):
         self.pyro_np = pyro_np
 
+    @classmethod
+    def get_cost(cls, method):
+        # Static operation and memory traffic counts per grid point
+        from minipyro.codegen.cost import Cost
+        return Cost(**cls.costs[method])
+
+    def _pyro_make_array(self, res_list):
+%if mixed:
+        # Terms computed in float64 are stored in float32
+        return self._pyro_cast(self.pyro_np.stack(res_list), np.float32)
+%else:
+        return self.pyro_np.stack(res_list)
+%endif
+%if prologues['get_rxn_rate']:
+
+    def _pyro_cast(self, ary, dtype):
+        # Arguments in the working precision, for NumPy arrays only
+        if self.pyro_np is np:
+            return np.asarray(ary, dtype=dtype)
+        return ary
+%endif
+
+    def get_fwd_rate_coefficients(self, temperature):
+%for line in prologues['get_fwd_rate_coefficients']:
+        ${line}
+%endfor
+        pyro_zero = 0 * temperature
+%for name, expr in rate_coeffs.assignments:
+        ${name} = ${cgm.rec(expr)}
+%endfor
+        return self._pyro_make_array([
+%for expr in rate_coeffs.exprs:
+            ${cgm.rec(expr)},
+%endfor
+        ])
+
     def get_rxn_rate(self, temperature, concentration):
-        k = ${cgm.rec(arrhenius_expr(rxn, Variable("temperature")))}
-        conc_product = ${cgm.rec(conc_product)}
-        return k * conc_product
-""", strict_undefined=True)
+        # Forward rates of progress, one row per reaction
+%for line in prologues['get_rxn_rate']:
+        ${line}
+%endfor
+%for name, expr in rxn_rates.assignments:
+        ${name} = ${cgm.rec(expr)}
+%endfor
+        return self._pyro_make_array([
+%for expr in rxn_rates.exprs:
+            ${cgm.rec(expr)},
+%endfor
+        ])
+
+    def get_rxn_rate_jacobian(self, temperature, concentration):
+        # Row i is d(rxn_rate[i])/d(temperature), followed by
+        # d(rxn_rate[i])/d(concentration[k]) for every species k
+%for line in prologues['get_rxn_rate_jacobian']:
+        ${line}
+%endfor
+        pyro_zero = 0 * temperature
+%for name, expr in jacobian.assignments:
+        ${name} = ${cgm.rec(expr)}
+%endfor
+        return self._pyro_make_array([
+%for i in range(len(rxn_rates.exprs)):
+            self._pyro_make_array([
+%for expr in jacobian.exprs[i * num_cols:(i + 1) * num_cols]:
+                ${cgm.rec(expr)},
+%endfor
+            ]),
+%endfor
+        ])
+"""
+
+
+# Same API for NumPy only, as straight-line in-place ufunc calls
+inplace_tpl_str = """
+import numpy as np
+
+
+class Thermochemistry:
+
+    num_species = ${len(species_names)}
+    num_reactions = ${num_reactions}
+    species_names = ${repr(tuple(species_names))}
+    costs = ${repr(costs)}
+    dtype = np.${dtype}
+
+    def __init__(self):
+        self._workspaces = {}
+
+    @classmethod
+    def get_cost(cls, method):
+        # Static operation and memory traffic counts per grid point
+        from minipyro.codegen.cost import Cost
+        return Cost(**cls.costs[method])
+
+    def _get_workspace(self, method, num_buffers, shape, dtype):
+        # Intermediates live in buffers kept per method and grid shape, so
+        # that calls after the first allocate no arrays when out is given
+        key = (method, shape, dtype)
+        if key not in self._workspaces:
+            self._workspaces[key] = [
+                np.empty(shape, dtype=dtype) for _ in range(num_buffers)
+            ]
+        return self._workspaces[key]
+
+    def _get_out(self, out, shape):
+        if out is None:
+            return np.empty(shape, dtype=self.dtype)
+        if (out.shape != shape or out.dtype != self.dtype
+                or not out.flags.c_contiguous):
+            raise ValueError(
+                f'out must be a C-contiguous {self.dtype.__name__} array of '
+                f'shape {shape}'
+            )
+        return out
+%for method, arg_names, out_axes, program in methods:
+
+    def ${method}(self, ${', '.join(arg_names)}, out=None):
+        add, multiply, divide = np.add, np.multiply, np.divide
+        exp, log, copyto = np.exp, np.log, np.copyto
+%for line in prologues[method]:
+        ${line}
+%endfor
+        shape = np.shape(temperature)
+        ws = self._get_workspace(
+            '${method}', ${program.num_buffers}, shape, self.dtype
+        )
+%if program.num_wide_buffers:
+        ws64 = self._get_workspace(
+            '${method}', ${program.num_wide_buffers}, shape, np.float64
+        )
+%endif
+        out = self._get_out(out, ${repr(out_axes)} + shape)
+        # Rows of scalar inputs are kept 1D, so that rows[k] is a view
+        rows = out.reshape((-1,) + (shape or (1,)))
+%for line in program.lines:
+        ${line}
+%endfor
+        return out
+%endfor
+"""
+
+
+# Appended to either class when profiling is requested, so that classes
+# generated without it carry no instrumentation at all
+profile_tpl_str = """
+
+import functools
+from time import perf_counter_ns as _pyro_clock
+from minipyro.profiling import Collector, get_nbytes, get_size
+
+
+def _pyro_profiled(method):
+
+    @functools.wraps(method)
+    def profiled(self, temperature, *args, **kwargs):
+        t_start = _pyro_clock()
+        result = method(self, temperature, *args, **kwargs)
+        self.collector.record(
+            method.__name__, 'Thermochemistry', t_start, _pyro_clock(),
+            get_nbytes(result), get_size(temperature)
+        )
+        return result
+    return profiled
+
+
+# Shared by all instances unless one is given its own
+Thermochemistry.collector = Collector()
+for _pyro_name in ('get_fwd_rate_coefficients', 'get_rxn_rate',
+                   'get_rxn_rate_jacobian'):
+    setattr(Thermochemistry, _pyro_name,
+            _pyro_profiled(getattr(Thermochemistry, _pyro_name)))
+"""
+
+
+# {{{ In-place emission
+
+_ufunc_names = {Sum: 'add', Product: 'multiply', Quotient: 'divide'}
+
+
+class UfuncProgram:
 
+    def __init__(self, lines, num_buffers, num_wide_buffers=0):
+        self.lines = lines
+        self.num_buffers = num_buffers
+        self.num_wide_buffers = num_wide_buffers
 
-def get_thermochem_class():
 
-    rxn = ct.Reaction(
-        # Reactants & Products for M + N -> P + Q
-        {'m': 1, 'n': 1}, {'p': 1, 'q': 1},
-        # Arrhenius coefficients, taken from Reaction 1, San Diego mech
-        {'A': 35127309770106.477, 'b': -0.7, 'Ea': 8590 * ct.gas_constant}
+def _is_leaf(expr):
+    return not isinstance(expr, (Sum, Product, Quotient, Call))
+
+
+def emit_ufunc_program(exprs, mixed=False):
+    # Every unique node is computed once, children first, by a ufunc call
+    # with out= set to a workspace buffer ws[k] or directly to its row of
+    # the output. Buffers are reused once their last reader has run. With
+    # mixed, nodes that depend on temperature only (exp arguments among
+    # them) are kept in float64 buffers ws64[k].
+    cgm = CodeGenerationMapper()
+    order, seen = [], set()
+    stack = [(e, False) for e in reversed(exprs) if not _is_leaf(e)]
+    while stack:
+        node, children_done = stack.pop()
+        if node in seen:
+            continue
+        if children_done:
+            seen.add(node)
+            order.append(node)
+            continue
+        stack.append((node, True))
+        stack.extend(
+            (c, False) for c in get_children(node)
+            if not _is_leaf(c) and c not in seen
+        )
+
+    out_rows = {}
+    for k, e in enumerate(exprs):
+        out_rows.setdefault(e, []).append(k)
+    uses, last_use = Counter(), {}
+    for pos, node in enumerate(order):
+        for c in get_children(node):
+            uses[c] += 1
+            last_use[c] = pos
+
+    wide = set()
+    if mixed:
+        for node in order:
+            if all(c in wide or isinstance(c, (numbers.Number, Variable))
+                   for c in get_children(node)):
+                wide.add(node)
+
+    lines, buffers = [], {}
+    free = {'ws': [], 'ws64': []}
+    num_buffers = {'ws': 0, 'ws64': 0}
+
+    def operand(c):
+        return '{}[{}]'.format(*buffers[c]) if c in buffers else cgm.rec(c)
+
+    for pos, node in enumerate(order):
+        rows = out_rows.get(node, [])
+        if len(rows) == 1 and not uses[node]:
+            dest = f'rows[{rows[0]}]'
+        else:
+            pool = 'ws64' if node in wide else 'ws'
+            if not free[pool]:
+                free[pool].append(num_buffers[pool])
+                num_buffers[pool] += 1
+            buffers[node] = pool, free[pool].pop()
+            dest = operand(node)
+
+        if isinstance(node, Call):
+            lines.append(
+                f'{node.fn_name.name}({operand(node.fn_arg)}, out={dest})'
+            )
+        else:
+            ufunc = _ufunc_names[type(node)]
+            args = [operand(c) for c in get_children(node)]
+            lines.append(f'{ufunc}({args[0]}, {args[1]}, out={dest})')
+            lines.extend(f'{ufunc}({dest}, {a}, out={dest})' for a in args[2:])
+        if dest.startswith('ws'):
+            lines.extend(f'copyto(rows[{k}], {dest})' for k in rows)
+
+        # Operands are released after the destination is taken, since
+        # multi-term sums write the destination before their last read
+        for c in get_children(node):
+            if last_use.get(c) == pos and c in buffers:
+                pool, k = buffers.pop(c)
+                free[pool].append(k)
+
+    # Outputs that are inputs or constants, the latter grouped by value
+    consts = {}
+    for k, e in enumerate(exprs):
+        if isinstance(e, numbers.Number):
+            consts.setdefault(e, []).append(k)
+        elif _is_leaf(e):
+            lines.append(f'copyto(rows[{k}], {cgm.rec(e)})')
+    lines.extend(f'rows[{rows}] = {value}' for value, rows in consts.items())
+    return UfuncProgram(lines, num_buffers['ws'], num_buffers['ws64'])
+
+# }}}
+
+
+def _as_array_expr(expr, zero):
+    # Constant entries (e.g. temperature-independent rate coefficients) are
+    # broadcast against a zero array, so that every pyro_np can stack them
+    if isinstance(expr, numbers.Number):
+        return zero if expr == 0 else zero + expr
+    return expr
+
+
+def get_mechanism_fingerprint(mech=None, skip_unsupported=False):
+    # YAML files are identified by content, without building a ct.Solution
+    if isinstance(mech, (str, os.PathLike)) and os.path.isfile(mech):
+        with open(mech, 'rb') as fh:
+            return fh.read()
+    from minipyro.chem_expr import get_mechanism_fingerprint
+    return get_mechanism_fingerprint(mech, skip_unsupported)
+
+
+# Supported working precisions, with their sizes in bytes
+ITEMSIZES = {'float32': 4, 'float64': 8}
+
+
+def get_prologues(methods, dtype, mixed, inplace):
+    # Lines casting the arguments of each method to the working precision.
+    # With mixed, temperature stays float64, so that exp arguments and
+    # everything else depending on temperature only are computed in it.
+    if dtype == 'float64':
+        return {method: [] for method, _, _, _ in methods}
+    arg_dtypes = {
+        'temperature': 'float64' if mixed else dtype, 'concentration': dtype
+    }
+    cast = 'np.asarray({0}, dtype=np.{1})' if inplace else \
+        'self._pyro_cast({0}, np.{1})'
+    return {
+        method: [
+            f'{name} = ' + cast.format(name, arg_dtypes[name])
+            for name in arg_names
+        ]
+        for method, arg_names, _, _ in methods
+    }
+
+
+def generate_code(mech=None, inplace=False, profile=False, dtype='float64',
+                  mixed=False, skip_unsupported=False):
+    from mako.template import Template
+    from minipyro.chem_expr import (
+        get_mechanism, arrhenius_expr, rxn_rate_expr
     )
 
+    if dtype not in ITEMSIZES:
+        raise ValueError(f'Unsupported dtype {dtype}')
+    if mixed and dtype != 'float32':
+        raise ValueError('mixed needs float32 storage')
+
+    species_names, reactions = get_mechanism(mech, skip_unsupported)
+
+    temp = Variable('temperature')
     conc = Variable('concentration')
-    conc_product = conc[0] * conc[1]
+    coeff_exprs = simplify([arrhenius_expr(rxn, temp) for rxn in reactions])
+    rate_exprs = simplify([
+        rxn_rate_expr(rxn, species_names, temp, conc) for rxn in reactions
+    ])
+    wrt = [temp] + [conc[k] for k in range(len(species_names))]
+    jac_exprs = simplify([
+        expr for row in get_jacobian(rate_exprs, wrt) for expr in row
+    ])
+
+    num_rxns = len(reactions)
+    methods = [
+        ('get_fwd_rate_coefficients', ['temperature'], (num_rxns,),
+         coeff_exprs),
+        ('get_rxn_rate', ['temperature', 'concentration'], (num_rxns,),
+         rate_exprs),
+        ('get_rxn_rate_jacobian', ['temperature', 'concentration'],
+         (num_rxns, len(wrt)), jac_exprs),
+    ]
 
     cgm = CodeGenerationMapper()
+    itemsize = ITEMSIZES[dtype]
+    prologues = get_prologues(methods, dtype, mixed, inplace)
+    if inplace:
+        # Shared subexpressions are computed once by construction, after
+        # c / x -> c * (1 / x) exposes the shared reciprocals
+        normalize = NormalizationMapper()
+        methods = [
+            (method, arg_names, out_axes, [normalize.rec(e) for e in exprs])
+            for method, arg_names, out_axes, exprs in methods
+        ]
+        code_str = Template(inplace_tpl_str, strict_undefined=True).render(
+            species_names=species_names,
+            num_reactions=num_rxns,
+            methods=[
+                (method, arg_names, out_axes,
+                 emit_ufunc_program(exprs, mixed))
+                for method, arg_names, out_axes, exprs in methods
+            ],
+            costs={
+                method: get_cost(exprs, itemsize).as_dict()
+                for method, _, _, exprs in methods
+            },
+            dtype=dtype,
+            prologues=prologues,
+        )
+        return code_str + profile_tpl_str if profile else code_str
+
+    pyro_zero = Variable('pyro_zero')
+    rate_coeffs = eliminate_common_subexpressions([
+        _as_array_expr(expr, pyro_zero) for expr in coeff_exprs
+    ])
+    rxn_rates = eliminate_common_subexpressions(rate_exprs)
+    jacobian = eliminate_common_subexpressions([
+        _as_array_expr(expr, pyro_zero) for expr in jac_exprs
+    ])
+
+    code_tpl = Template(code_tpl_str, strict_undefined=True)
     code_str = code_tpl.render(
-        Variable=Variable,
-        arrhenius_expr=arrhenius_expr,
-        conc_product=conc_product,
-        rxn=rxn,
+        species_names=species_names,
+        rate_coeffs=rate_coeffs,
+        rxn_rates=rxn_rates,
+        jacobian=jacobian,
+        num_cols=len(wrt),
+        cse_savings={
+            'get_fwd_rate_coefficients': rate_coeffs.savings,
+            'get_rxn_rate': rxn_rates.savings,
+            'get_rxn_rate_jacobian': jacobian.savings,
+        },
+        costs={
+            method: get_cost(exprs, itemsize).as_dict()
+            for method, _, _, exprs in methods
+        },
+        dtype=dtype,
+        mixed=mixed,
+        prologues=prologues,
         cgm=cgm,
     )
+    return code_str + profile_tpl_str if profile else code_str
+
+
+def get_thermochem_class(mech=None, use_cache=True, inplace=False,
+                         profile=False, dtype='float64', mixed=False,
+                         skip_unsupported=False):
+    # inplace=True gives a NumPy-only class whose methods take out= and
+    # run without temporaries, see inplace_tpl_str. profile=True times
+    # every call into the class attribute collector, a
+    # minipyro.profiling.Collector. dtype='float32' casts NumPy arguments
+    # and computes in single precision; mixed=True with it keeps
+    # temperature-only terms, exp arguments among them, in float64 and
+    # stores the results in float32. skip_unsupported=True leaves out, with
+    # a warning, the reactions chem_expr has no rate expression for.
+
+    if use_cache:
+        cache_dir = cache.get_cache_dir('thermochem')
+        key = cache.content_hash(
+            get_mechanism_fingerprint(mech, skip_unsupported),
+            inplace_tpl_str if inplace else code_tpl_str,
+            profile_tpl_str if profile else '',
+            dtype, mixed, skip_unsupported,
+            cache.get_version()
+        )
+        module = cache.load_module(cache_dir, key)
+        if module is None:
+            module = cache.store_module(
+                cache_dir, key,
+                generate_code(mech, inplace, profile, dtype, mixed,
+                              skip_unsupported)
+            )
+        if module is not None:
+            with open(module.__file__) as fh:
+                module._MODULE_SOURCE_CODE = fh.read()
+            # Also on the class, from which e.g. worker processes rebuild it
+            module.Thermochemistry._MODULE_SOURCE_CODE = \
+                module._MODULE_SOURCE_CODE
+            return module.Thermochemistry
 
+    code_str = generate_code(mech, inplace, profile, dtype, mixed,
+                             skip_unsupported)
     exec_dict = {}
-    exec(compile(code_str, '<generated code', 'exec'), exec_dict)
+    exec(compile(code_str, '<generated code>', 'exec'), exec_dict)
     exec_dict['_MODULE_SOURCE_CODE'] = code_str
+    exec_dict['Thermochemistry']._MODULE_SOURCE_CODE = code_str
     return exec_dict['Thermochemistry']
@@ -0,0 +1,85 @@
+import os
+import json
+import threading
+
+
+# {{{ Collector
+
+class Collector:
+    # Appends one tuple per timed region and aggregates only on export, so
+    # recording costs a clock read and a list append. Times are in ns from
+    # perf_counter_ns. result_bytes is the size of what a region returns
+    # (the output array, or a grad_fn's adjoints), not all it allocates,
+    # which would take tracing every allocation.
+
+    def __init__(self):
+        self.events = []
+
+    def record(self, name, category, t_start, t_end, result_bytes=0,
+               grid_size=0):
+        self.events.append((
+            name, category, t_start, t_end, result_bytes, grid_size,
+            threading.get_ident()
+        ))
+
+    def clear(self):
+        self.events = []
+
+    def as_dict(self):
+        # One entry per category and name, e.g. 'Thermochemistry.get_rxn_rate'
+        # or 'AutodiffWalker.AutodiffProduct', with times in seconds
+        stats = {}
+        for event in self.events:
+            name, category, t_start, t_end, result_bytes, grid_size, _ = event
+            entry = stats.setdefault(f'{category}.{name}', {
+                'calls': 0, 'time': 0.0, 'max_time': 0.0, 'result_bytes': 0,
+                'grid_size': 0,
+            })
+            elapsed = 1e-9 * (t_end - t_start)
+            entry['calls'] += 1
+            entry['time'] += elapsed
+            entry['max_time'] = max(entry['max_time'], elapsed)
+            entry['result_bytes'] += result_bytes
+            entry['grid_size'] = max(entry['grid_size'], grid_size)
+        return stats
+
+    def to_chrome_trace(self, path=None):
+        # Complete ('X') trace events, in microseconds from the first event,
+        # as read by chrome://tracing and Perfetto
+        t_0 = min((e[2] for e in self.events), default=0)
+        pid = os.getpid()
+        trace = {'traceEvents': [
+            {
+                'name': name, 'cat': category, 'ph': 'X',
+                'ts': (t_start - t_0) / 1000, 'dur': (t_end - t_start) / 1000,
+                'pid': pid, 'tid': tid,
+                'args': {'result_bytes': result_bytes, 'grid_size': grid_size},
+            }
+            for name, category, t_start, t_end, result_bytes, grid_size, tid
+            in self.events
+        ], 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w') as fh:
+                json.dump(trace, fh)
+        return trace
+
+# }}}
+
+
+# {{{ Helpers for instrumented code
+
+def get_nbytes(ary):
+    # NumPy arrays, and arrays that wrap them in .values (e.g. adiff_np)
+    nbytes = getattr(ary, 'nbytes', None)
+    if nbytes is None:
+        nbytes = getattr(getattr(ary, 'values', None), 'nbytes', 0)
+    return nbytes
+
+
+def get_size(ary):
+    size = 1
+    for n in getattr(ary, 'shape', ()):
+        size *= n
+    return size
+
+# }}}
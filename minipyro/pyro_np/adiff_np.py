@@ -1,30 +1,276 @@
 import numbers
+from collections import OrderedDict
+from time import perf_counter_ns
 import numpy as np
 
 
+# Recompute cost of an exp or log node relative to an arithmetic one, by
+# which a Checkpointer releases the cheapest nodes first. Only the order
+# of costs matters.
+TRANSCENDENTAL_COST = 20
+
+
 # {{{ Graph Walker
 
 class AutodiffWalker:
+    # Reverse sweep over a topological order of the graph. A node's adjoint
+    # is complete before its grad_fn runs, so every grad_fn runs exactly
+    # once, however many paths lead to the node.
 
     def compute_gradient(self, ary):
-        prec_grad = np.ones_like(ary.values)
+        # Under a Checkpointer, the output keeps its values for the caller
+        if ary.checkpointer is None:
+            return self.sweep(ary)
+        if ary._values is None:
+            ary.checkpointer.rematerialize(ary)
+        ary.checkpointer.pinned.add(ary)
+        try:
+            return self.sweep(ary)
+        finally:
+            ary.checkpointer.pinned.discard(ary)
+
+    def sweep(self, ary):
+        self.adjoints = {ary: np.ones_like(ary.values)}
+        self.owned = set()
         self.gradients = {}
-        self.rec(ary, prec_grad)
+        for node in reversed(self.topological_order(ary)):
+            grad = self.adjoints.pop(node)
+            # Only parents, all swept by now, read a node's values; under a
+            # Checkpointer they go before its grad_fn allocates
+            if node.checkpointer is not None and node is not ary:
+                node.checkpointer.release(node)
+            if isinstance(node, AutodiffVariable):
+                if node.name in self.gradients:
+                    self.gradients[node.name] = self.gradients[node.name] + grad
+                else:
+                    self.gradients[node.name] = grad
+                continue
+            if isinstance(node, AutodiffSubscript):
+                self.scatter(node.children[0], node.idx, grad)
+                continue
+            for c, g in zip(node.children, node.grad_fn(grad)):
+                if isinstance(c, AutodiffArray):
+                    self.accumulate(c, g)
         return self.gradients
 
-    def rec(self, ary, prec_grad):
-        if isinstance(ary, AutodiffVariable):
-            if ary.name in self.gradients:
-                self.gradients[ary.name] += prec_grad
-            else:
-                self.gradients[ary.name] = prec_grad
+    def topological_order(self, ary):
+        # Children before parents, without recursion
+        order, seen = [], set()
+        stack = [(ary, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node in seen:
+                continue
+            if children_done:
+                seen.add(node)
+                order.append(node)
+                continue
+            stack.append((node, True))
+            stack.extend(
+                (c, False) for c in node.children
+                if isinstance(c, AutodiffArray) and c not in seen
+            )
+        return order
+
+    def accumulate(self, ary, grad):
+        # grad_fns may hand the same array to several children (sums do),
+        # so adjoints are only updated in place once they own their buffer
+        if ary not in self.adjoints:
+            self.adjoints[ary] = grad
+        elif ary in self.owned:
+            self.adjoints[ary] += grad
+        else:
+            self.adjoints[ary] = self.adjoints[ary] + grad
+            self.owned.add(ary)
+
+    def scatter(self, ary, idx, grad):
+        # Subscript adjoints are added in place into one buffer per parent,
+        # rather than each padded out to the parent's full shape
+        if ary not in self.owned:
+            buf = np.zeros(ary.shape, dtype=ary.values.dtype)
+            if ary in self.adjoints:
+                buf += self.adjoints[ary]
+            self.adjoints[ary] = buf
+            self.owned.add(ary)
+        if is_basic_index(idx):
+            # Views never repeat an element, the buffered add is exact
+            self.adjoints[ary][idx] += grad
         else:
-            self.propagate_gradients(ary, prec_grad)
+            np.add.at(self.adjoints[ary], idx, grad)
+
+
+def is_basic_index(idx):
+    # Integers and slices, alone or in a tuple, select a view
+    items = idx if isinstance(idx, tuple) else (idx,)
+    return all(
+        isinstance(i, (numbers.Integral, slice)) or i is None or i is Ellipsis
+        for i in items
+    )
+
+
+class ProfilingAutodiffWalker(AutodiffWalker):
+    # Records the sweep, every grad_fn by node type, and every scatter into
+    # a minipyro.profiling.Collector. grad_fns are wrapped on the nodes for
+    # the duration of the sweep only, AutodiffWalker itself is untouched.
+
+    category = 'AutodiffWalker'
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def compute_gradient(self, ary):
+        self.instrumented = []
+        t_start = perf_counter_ns()
+        try:
+            return super().compute_gradient(ary)
+        finally:
+            self.collector.record(
+                'compute_gradient', self.category, t_start, perf_counter_ns(),
+                grid_size=ary.values.size
+            )
+            for node, grad_fn in self.instrumented:
+                if grad_fn is None:
+                    del node.grad_fn
+                else:
+                    node.grad_fn = grad_fn
+
+    def topological_order(self, ary):
+        order = super().topological_order(ary)
+        for node in order:
+            if not isinstance(node, (AutodiffVariable, AutodiffSubscript)):
+                self.instrumented.append((node, node.__dict__.get('grad_fn')))
+                node.grad_fn = self.timed(node)
+        return order
+
+    def timed(self, node):
+        # exp and log are plain AutodiffArrays, named by their grad_fn
+        grad_fn = node.grad_fn
+        name = type(node).__name__
+        if type(node) is AutodiffArray:
+            name = grad_fn.__qualname__.split('.')[0]
+
+        def timed_grad_fn(grad):
+            t_start = perf_counter_ns()
+            result = grad_fn(grad)
+            self.collector.record(
+                name, self.category, t_start, perf_counter_ns(),
+                sum(g.nbytes for g in result if g is not grad), grad.size
+            )
+            return result
+        return timed_grad_fn
+
+    def scatter(self, ary, idx, grad):
+        t_start = perf_counter_ns()
+        super().scatter(ary, idx, grad)
+        self.collector.record(
+            'AutodiffSubscript', self.category, t_start, perf_counter_ns(),
+            grid_size=grad.size
+        )
+
+# }}}
+
 
-    def propagate_gradients(self, ary, prec_grad):
-        for c, g in zip(ary.children, ary.grad_fn(prec_grad)):
-            if isinstance(c, AutodiffArray):
-                self.rec(c, g)
+# {{{ Checkpointing
+
+# Checkpointers of the enclosing with blocks, innermost last
+_checkpointers = []
+
+
+def get_checkpointer():
+    return _checkpointers[-1] if _checkpointers else None
+
+
+class Checkpointer:
+    # Keeps the values of the nodes created under it (with Checkpointer(...))
+    # within budget bytes. Past it, the values of older nodes are released,
+    # and recomputed from their children when next read, in the forward
+    # pass or in gradient(). Sums, products and quotients go first, exp and
+    # log results last, each least recently used first. AutodiffVariables
+    # and views, e.g. subscripts, are never released. gradient() also
+    # releases every node once its adjoint is swept.
+
+    def __init__(self, budget):
+        self.budget = budget
+        # Resident nodes and their sizes, by recompute cost, in LRU order
+        self.resident = {}
+        self.nbytes = 0
+        self.peak_nbytes = 0
+        self.num_recomputed = 0
+        # Nodes being recomputed, which must stay until their parents are
+        self.pinned = set()
+
+    def __enter__(self):
+        _checkpointers.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _checkpointers.remove(self)
+
+    def admit(self, node):
+        if not node._values.flags.owndata:
+            return
+        nbytes = node._values.nbytes
+        self.make_room(nbytes)
+        queue = self.resident.setdefault(node.recompute_cost, OrderedDict())
+        queue[node] = nbytes
+        self.nbytes += nbytes
+        self.peak_nbytes = max(self.peak_nbytes, self.nbytes)
+
+    def make_room(self, nbytes):
+        # Goes over budget when everything left is pinned
+        for cost in sorted(self.resident):
+            queue = self.resident[cost]
+            for _ in range(len(queue)):
+                if self.nbytes + nbytes <= self.budget:
+                    return
+                node = next(iter(queue))
+                if node in self.pinned:
+                    queue.move_to_end(node)
+                else:
+                    self.release(node)
+
+    def touch(self, node):
+        queue = self.resident.get(node.recompute_cost)
+        if queue is not None and node in queue:
+            queue.move_to_end(node)
+
+    def release(self, node):
+        queue = self.resident.get(node.recompute_cost, {})
+        self.nbytes -= queue.pop(node, 0)
+        node._values = None
+
+    def rematerialize(self, ary):
+        # Released descendants first, children before parents, without
+        # recursion
+        order, seen = [], set()
+        stack = [(ary, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                order.append(node)
+                continue
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.append((node, True))
+            stack.extend(
+                (c, False) for c in node.children
+                if isinstance(c, AutodiffArray) and c._values is None
+            )
+        self.pinned.update(order)
+        try:
+            for node in order:
+                node.values = node.compute()
+                self.num_recomputed += 1
+        finally:
+            self.pinned.difference_update(order)
+
+    def as_dict(self):
+        return {
+            'budget': self.budget, 'nbytes': self.nbytes,
+            'peak_nbytes': self.peak_nbytes,
+            'num_recomputed': self.num_recomputed,
+        }
 
 # }}}
 
@@ -70,12 +316,46 @@ class LoopyMapper:
 
 # {{{ Arrays
 
+def get_values(ary):
+    return ary.values if isinstance(ary, AutodiffArray) else ary
+
+
 class AutodiffArray:
+    # Values are read through a property, so that nodes created under a
+    # Checkpointer may release them and compute them again from their
+    # children. recompute_cost ranks which are released first.
+
+    checkpointer = None
 
-    def __init__(self, values: list, children, name=None):
-        self.values = np.array(values, dtype=np.float64)
+    def __init__(self, values: list, children, name=None, recompute_cost=1):
+        # float32 values stay in single precision, anything else is float64
+        values = np.array(values)
+        if values.dtype != np.float32:
+            values = values.astype(np.float64, copy=False)
         self.children = children
         self.name = name
+        self.recompute_cost = recompute_cost
+        self.checkpointer = get_checkpointer()
+        self.values = values
+
+    @property
+    def values(self):
+        if self._values is None:
+            self.checkpointer.rematerialize(self)
+        elif self.checkpointer is not None:
+            self.checkpointer.touch(self)
+        return self._values
+
+    @values.setter
+    def values(self, values):
+        self._values = values
+        if self.checkpointer is not None:
+            self.checkpointer.admit(self)
+
+    def compute(self):
+        raise NotImplementedError(
+            f'{type(self).__name__} cannot be recomputed'
+        )
 
     @property
     def shape(self,):
@@ -130,6 +410,15 @@ class AutodiffArray:
         else:
             raise ValueError
 
+    def __truediv__(self, other):
+        if isinstance(other, (AutodiffArray, numbers.Number)):
+            return AutodiffQuotient(
+                self.values / get_values(other),
+                children=[self, other]
+            )
+        else:
+            raise ValueError
+
     def __rtruediv__(self, other):
         if isinstance(other, AutodiffArray):
             return AutodiffRevQuotient(
@@ -161,8 +450,12 @@ class AutodiffArray:
     def zero_grads(self,):
         self.grad_values = np.zeros_like(self.values)
 
-    def gradient(self,):
-        ad_walker = AutodiffWalker()
+    def gradient(self, collector=None):
+        # Given a minipyro.profiling.Collector, the sweep is profiled into it
+        if collector is None:
+            ad_walker = AutodiffWalker()
+        else:
+            ad_walker = ProfilingAutodiffWalker(collector)
         return ad_walker.compute_gradient(self)
 
 
@@ -179,6 +472,9 @@ class AutodiffVariable(AutodiffArray):
 
 class AutodiffSum(AutodiffArray):
 
+    def compute(self):
+        return self.children[0].values + get_values(self.children[1])
+
     def grad_fn(self, grad):
         if isinstance(self.children[1], AutodiffArray):
             return (grad, grad)
@@ -188,6 +484,9 @@ class AutodiffSum(AutodiffArray):
 
 class AutodiffProduct(AutodiffArray):
 
+    def compute(self):
+        return self.children[0].values * get_values(self.children[1])
+
     def grad_fn(self, grad):
         if isinstance(self.children[1], AutodiffArray):
             return (
@@ -202,6 +501,9 @@ class AutodiffProduct(AutodiffArray):
 
 class AutodiffRevQuotient(AutodiffArray):
 
+    def compute(self):
+        return get_values(self.children[1]) / self.children[0].values
+
     def grad_fn(self, grad):
         if isinstance(self.children[1], AutodiffArray):
             return (
@@ -214,20 +516,51 @@ class AutodiffRevQuotient(AutodiffArray):
             )
 
 
+class AutodiffQuotient(AutodiffArray):
+
+    def compute(self):
+        return self.children[0].values / get_values(self.children[1])
+
+    def grad_fn(self, grad):
+        if isinstance(self.children[1], AutodiffArray):
+            return (
+                grad / self.children[1].values,
+                -grad * self.children[0].values / self.children[1].values ** 2
+            )
+        else:
+            return (
+                grad / self.children[1],
+            )
+
+
 class AutodiffSubscript(AutodiffArray):
 
     def __init__(self, values, children, idx):
-        self.values = values[idx]
         self.children = children
         self.idx = idx
         self.p_shape = values.shape
+        self.recompute_cost = 1
+        self.checkpointer = get_checkpointer()
+        self.values = values[idx]
+
+    def compute(self):
+        return self.children[0].values[self.idx]
 
     def grad_fn(self, grad):
-        out_grad = np.zeros(self.p_shape)
+        out_grad = np.zeros(self.p_shape, dtype=self.values.dtype)
         out_grad[self.idx] = grad
         return (out_grad,)
 
 
+class AutodiffStack(AutodiffArray):
+
+    def compute(self):
+        return np.stack([c.values for c in self.children])
+
+    def grad_fn(self, grad):
+        return tuple(grad[i] for i in range(len(self.children)))
+
+
 # }}}
 
 
@@ -236,22 +569,39 @@ class AutodiffSubscript(AutodiffArray):
 def exp(ary: AutodiffArray):
     def grad_fn(grad):
         return (grad * np.exp(ary.values),)
+
+    def compute():
+        return np.exp(ary.values)
     new_ary = AutodiffArray(
-        np.exp(ary.values),
-        children=[ary]
+        compute(),
+        children=[ary],
+        recompute_cost=TRANSCENDENTAL_COST
     )
     new_ary.grad_fn = grad_fn
+    new_ary.compute = compute
     return new_ary
 
 
 def log(ary: AutodiffArray):
     def grad_fn(grad):
         return (grad / ary.values,)
+
+    def compute():
+        return np.log(ary.values)
     new_ary = AutodiffArray(
-        np.log(ary.values),
-        children=[ary]
+        compute(),
+        children=[ary],
+        recompute_cost=TRANSCENDENTAL_COST
     )
     new_ary.grad_fn = grad_fn
+    new_ary.compute = compute
     return new_ary
 
+
+def stack(arys):
+    return AutodiffStack(
+        np.stack([a.values for a in arys]),
+        children=list(arys)
+    )
+
 # }}}
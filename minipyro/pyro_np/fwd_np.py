@@ -0,0 +1,117 @@
+import numbers
+import numpy as np
+
+
+# {{{ Arrays
+
+class DualArray:
+    # Values with tangents along num_dirs directions, batched on a leading
+    # axis: tangents has shape (num_dirs, *values.shape). No graph is
+    # kept, intermediates are freed as soon as the generated code drops them.
+
+    def __init__(self, values, tangents):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.tangents = tangents
+
+    @property
+    def shape(self,):
+        return self.values.shape
+
+    @property
+    def num_dirs(self,):
+        return self.tangents.shape[0]
+
+    def __add__(self, other):
+        if isinstance(other, DualArray):
+            return DualArray(
+                self.values + other.values,
+                self.tangents + other.tangents
+            )
+        elif isinstance(other, numbers.Number):
+            return DualArray(self.values + other, self.tangents)
+        else:
+            raise ValueError
+
+    def __mul__(self, other):
+        if isinstance(other, DualArray):
+            return DualArray(
+                self.values * other.values,
+                self.tangents * other.values + self.values * other.tangents
+            )
+        elif isinstance(other, numbers.Number):
+            return DualArray(self.values * other, self.tangents * other)
+        else:
+            raise ValueError
+
+    def __getitem__(self, idx):
+        # The direction axis leads the tangents, ahead of every index
+        idx = idx if isinstance(idx, tuple) else (idx,)
+        return DualArray(self.values[idx],
+                         self.tangents[(slice(None),) + idx])
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        # d(x / o) = (dx - (x / o) do) / o
+        if isinstance(other, DualArray):
+            values = self.values / other.values
+            tangents = (self.tangents - values * other.tangents) / other.values
+            return DualArray(values, tangents)
+        elif isinstance(other, numbers.Number):
+            return DualArray(self.values / other, self.tangents / other)
+        else:
+            raise ValueError
+
+    def __rtruediv__(self, other):
+        # d(o / x) = (do - (o / x) dx) / x
+        if isinstance(other, DualArray):
+            values = other.values / self.values
+            return DualArray(
+                values, (other.tangents - values * self.tangents) / self.values
+            )
+        elif isinstance(other, numbers.Number):
+            values = other / self.values
+            return DualArray(values, -values / self.values * self.tangents)
+        else:
+            raise ValueError
+
+
+def seed(values, num_dirs, directions):
+    # Independent variable with unit tangents. An integer direction
+    # perturbs the whole array at once (e.g. temperature), a sequence
+    # perturbs row k along directions[k] (e.g. one direction per species).
+    values = np.asarray(values, dtype=np.float64)
+    tangents = np.zeros((num_dirs,) + values.shape)
+    if isinstance(directions, numbers.Integral):
+        tangents[directions] = 1
+    else:
+        for k, d in enumerate(directions):
+            tangents[d, k] = 1
+    return DualArray(values, tangents)
+
+# }}}
+
+
+# {{{ Math
+
+def exp(ary: DualArray):
+    values = np.exp(ary.values)
+    return DualArray(values, ary.tangents * values)
+
+
+def log(ary: DualArray):
+    return DualArray(np.log(ary.values), ary.tangents / ary.values)
+
+
+def stack(arys):
+    # Tangents keep the direction axis first
+    return DualArray(
+        np.stack([a.values for a in arys]),
+        np.stack([a.tangents for a in arys], axis=1)
+    )
+
+# }}}
@@ -0,0 +1,186 @@
+import os
+import ctypes
+import shlex
+import tempfile
+import subprocess
+import numpy as np
+from mako.template import Template
+from minipyro import cache
+from minipyro.codegen.mappers import LoopyMapper, Mapper
+from minipyro.pyro_np.lazy_np import (
+    count_uses, get_placeholders, get_output_rows
+)
+
+
+# {{{ Compilation
+
+def get_compiler():
+    # CC and CFLAGS as usual; -march=native is left out by default since
+    # the cache directory may be shared by heterogeneous nodes
+    return (
+        os.environ.get('CC', 'cc'),
+        shlex.split(os.environ.get('CFLAGS', '-O3'))
+    )
+
+
+def build_library(code_str):
+    # Compiles C source into a shared library, content-addressed on the
+    # source and the compiler invocation. Returns the library path.
+    cc, cflags = get_compiler()
+    cache_dir = cache.get_cache_dir('host')
+    key = cache.content_hash(code_str, cc, *cflags)
+    lib_path = os.path.join(cache_dir, f'{key}.so')
+    if cache.touch(lib_path):
+        return lib_path
+
+    with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+        src_path = os.path.join(build_dir, 'kernel.c')
+        with open(src_path, 'w') as fh:
+            fh.write(code_str)
+        tmp_path = os.path.join(build_dir, 'kernel.so')
+        cmd = [cc, *cflags, '-fPIC', '-shared', src_path, '-o', tmp_path]
+        try:
+            subprocess.run(
+                cmd[:1] + ['-fopenmp'] + cmd[1:] + ['-lm'],
+                check=True, capture_output=True
+            )
+        except subprocess.CalledProcessError as omp_err:
+            # Compilers without OpenMP still get a serial (SIMD) loop
+            try:
+                subprocess.run(cmd + ['-lm'], check=True,
+                               capture_output=True)
+            except subprocess.CalledProcessError as err:
+                raise RuntimeError(
+                    f'{cc} could not build the library\nwith -fopenmp:\n'
+                    f'{omp_err.stderr.decode(errors="replace")}\n'
+                    f'without:\n{err.stderr.decode(errors="replace")}'
+                ) from err
+        os.replace(tmp_path, lib_path)
+
+    cache.evict(cache_dir)
+    return lib_path
+
+# }}}
+
+
+# {{{ C lowering
+
+class CMapper(LoopyMapper):
+    # Lowers lazy_np graphs to C over a flattened grid index i. Nodes used
+    # more than once become temporaries, so that e.g. log(temperature) is
+    # computed once per point rather than once per reaction.
+
+    def __init__(self, shared):
+        super().__init__()
+        self.shared = shared
+        self.temporaries = []
+
+    def rec(self, ary, prec=None):
+        if ary in self.shared:
+            return Mapper.rec(self, ary)
+        return super().rec(ary, prec)
+
+    def assign(self, ary, expr_str):
+        if ary not in self.shared:
+            return expr_str
+        name = f't{len(self.temporaries)}'
+        self.temporaries.append((name, expr_str))
+        return name
+
+    def map_sum(self, ary):
+        return self.assign(ary, super().map_sum(ary))
+
+    def map_product(self, ary):
+        return self.assign(ary, super().map_product(ary))
+
+    def map_quotient(self, ary):
+        return self.assign(ary, super().map_quotient(ary))
+
+    def map_call(self, ary):
+        return self.assign(ary, super().map_call(ary))
+
+    def map_subscript(self, ary):
+        return '{:s}[{:d} * n + i]'.format(ary.expr.a.name, ary.expr.i)
+
+    def map_variable(self, ary):
+        return f'{ary.name}[i]'
+
+
+c_tpl = Template("""
+#include <math.h>
+#include <stdint.h>
+
+void ${knl_name}(
+    const int64_t n,
+%for name in arg_names:
+    const double *restrict ${name},
+%endfor
+    double *restrict out)
+{
+    #pragma omp parallel for simd schedule(static)
+    for (int64_t i = 0; i < n; ++i)
+    {
+%for name, expr in temporaries:
+        const double ${name} = ${expr};
+%endfor
+%for k, expr in enumerate(outputs):
+        out[${k} * n + i] = ${expr};
+%endfor
+    }
+}
+""", strict_undefined=True)
+
+# }}}
+
+
+# {{{ Kernel
+
+class HostKernel:
+
+    def __init__(self, lib_path, knl_name, arg_shapes, out_shape, grid_shape):
+        self.arg_shapes = arg_shapes
+        self.out_shape = out_shape
+        self.num_points = int(np.prod(grid_shape))
+        self.fn = getattr(ctypes.CDLL(lib_path), knl_name)
+        ptr = np.ctypeslib.ndpointer(dtype=np.float64, flags='C_CONTIGUOUS')
+        self.fn.argtypes = [ctypes.c_int64] + [ptr] * (len(arg_shapes) + 1)
+        self.fn.restype = None
+
+    def __call__(self, out=None, **bindings):
+        if out is None:
+            out = np.empty(self.out_shape)
+        args = []
+        for name, shape in self.arg_shapes.items():
+            a = np.ascontiguousarray(bindings[name], dtype=np.float64)
+            if a.shape != tuple(shape):
+                raise ValueError(
+                    f'{name} has shape {a.shape}, expected {tuple(shape)}'
+                )
+            args.append(a)
+        if out.shape != tuple(self.out_shape):
+            raise ValueError(
+                f'out has shape {out.shape}, expected {tuple(self.out_shape)}'
+            )
+        self.fn(self.num_points, *args, out)
+        return out
+
+
+def assemble_host(ary, knl_name):
+    mapper = CMapper({
+        node for node, n in count_uses(ary).items() if n > 1
+    })
+    outputs = [mapper.rec(o) for o in get_output_rows(ary)]
+
+    arg_shapes = get_placeholders(ary)
+    code_str = c_tpl.render(
+        knl_name=knl_name,
+        arg_names=list(arg_shapes),
+        temporaries=mapper.temporaries,
+        outputs=outputs,
+    )
+    knl = HostKernel(
+        build_library(code_str), knl_name, arg_shapes, ary.shape, ary.grid_shape
+    )
+    return knl, code_str
+
+# }}}
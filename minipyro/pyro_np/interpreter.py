@@ -0,0 +1,219 @@
+import numbers
+import numpy as np
+from minipyro.symbolic import Sum, Product, Quotient, Call, Subscript
+from minipyro.pyro_np.lazy_np import (
+    Placeholder, get_array_children, count_uses, get_placeholders,
+    get_call_arg_placeholders, get_output_rows
+)
+
+
+_ufuncs = {'exp': np.exp, 'log': np.log}
+
+
+# {{{ Interpreter
+
+class ChunkedInterpreter:
+    # Evaluates a lazy_np graph in one pass, chunk by chunk over the
+    # flattened grid. Intermediates live in a small pool of chunk-sized
+    # scratch buffers, reused once their last reader has run, so peak
+    # memory is bounded by the chunk size rather than the grid size.
+    # Buffers, inputs and the output are of dtype; with mixed, exp and log
+    # arguments are computed in float64 buffers of their own, from float64
+    # copies of the placeholders they read.
+
+    def __init__(self, ary, chunk_size=8192, dtype='float64', mixed=False):
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        self.out_shape = ary.shape
+        self.grid_shape = ary.grid_shape
+        self.arg_shapes = get_placeholders(ary)
+        wide_args = get_call_arg_placeholders(ary) if mixed else set()
+        self.arg_dtypes = {
+            name: np.dtype(np.float64) if name in wide_args else self.dtype
+            for name in self.arg_shapes
+        }
+
+        outputs = get_output_rows(ary)
+        uses = count_uses(ary)
+
+        # {{{ Linearize: children before parents, each unique node once
+
+        order, seen = [], set()
+        stack = [(o, False) for o in reversed(outputs)]
+        while stack:
+            node, children_done = stack.pop()
+            if node in seen or self.is_leaf(node):
+                continue
+            if children_done:
+                seen.add(node)
+                order.append(node)
+                continue
+            stack.append((node, True))
+            stack.extend((c, False) for c in get_array_children(node))
+
+        # }}}
+
+        # {{{ Register allocation
+
+        last_use = {}
+        for pos, node in enumerate(order):
+            for c in get_array_children(node):
+                last_use[c] = pos
+
+        # Nodes in call arguments, parents last, so one pass suffices
+        wide = set()
+        if mixed:
+            for node in reversed(order):
+                if isinstance(node.expr, Call) or node in wide:
+                    wide.update(get_array_children(node))
+
+        # Output rows of each node, by identity; a node may fill several
+        rows_of = {}
+        for k, o in enumerate(outputs):
+            rows_of.setdefault(id(o), []).append(k)
+
+        registers = {}
+        free = {'reg': [], 'reg64': []}
+        self.num_registers = {'reg': 0, 'reg64': 0}
+        self.program = []
+        for pos, node in enumerate(order):
+            args = [self.operand(c, registers) for c in self.get_args(node)]
+            out_rows = rows_of.get(id(node), [])
+            if len(out_rows) == 1 and uses.get(node, 0) <= 1:
+                # Written straight into the output, nobody else reads it
+                self.program.append(
+                    (self.get_op(node), args, ('out', out_rows[0]))
+                )
+            else:
+                pool = 'reg64' if node in wide else 'reg'
+                if not free[pool]:
+                    free[pool].append(self.num_registers[pool])
+                    self.num_registers[pool] += 1
+                registers[node] = dest = (pool, free[pool].pop())
+                self.program.append((self.get_op(node), args, dest))
+                self.program.extend(
+                    (None, [dest], ('out', k)) for k in out_rows
+                )
+            # Operands are released after the destination is taken, since
+            # multi-term sums write the destination before their last read
+            for c in get_array_children(node):
+                # Popped, so that x + x frees its register only once
+                if last_use.get(c) == pos and c in registers:
+                    pool, k = registers.pop(c)
+                    free[pool].append(k)
+
+        # Outputs that are plain (subscripted) placeholders
+        self.program.extend(
+            (None, [self.operand(o, registers)], ('out', k))
+            for k, o in enumerate(outputs) if self.is_leaf(o)
+        )
+
+        # }}}
+
+    @staticmethod
+    def is_leaf(node):
+        return (
+            isinstance(node, numbers.Number) or isinstance(node, Placeholder)
+            or isinstance(node.expr, Subscript)
+        )
+
+    @staticmethod
+    def get_args(node):
+        expr = node.expr
+        if isinstance(expr, (Sum, Product)):
+            return expr.children
+        if isinstance(expr, Quotient):
+            return (expr.num, expr.den)
+        if isinstance(expr, Call):
+            return (expr.fn_arg,)
+        raise NotImplementedError(f'Cannot interpret {type(expr).__name__}')
+
+    @staticmethod
+    def get_op(node):
+        expr = node.expr
+        if isinstance(expr, Sum):
+            return np.add
+        if isinstance(expr, Product):
+            return np.multiply
+        if isinstance(expr, Quotient):
+            return np.divide
+        return _ufuncs[expr.fn_name]
+
+    @staticmethod
+    def operand(node, registers):
+        if isinstance(node, numbers.Number):
+            return ('const', node)
+        if isinstance(node, Placeholder):
+            return ('in', node.name, None)
+        if isinstance(node.expr, Subscript):
+            return ('in', node.expr.a.name, node.expr.i)
+        return registers[node]
+
+    def __call__(self, out=None, **bindings):
+        num_points = int(np.prod(self.grid_shape))
+        if out is None:
+            out = np.empty(self.out_shape, dtype=self.dtype)
+        if (out.shape != tuple(self.out_shape) or out.dtype != self.dtype
+                or not out.flags.c_contiguous):
+            raise ValueError(
+                f'out must be a C-contiguous {self.dtype} array of shape '
+                f'{tuple(self.out_shape)}'
+            )
+
+        # Flatten the grid axes; placeholders keep their leading axis
+        flat = {}
+        for name, shape in self.arg_shapes.items():
+            a = np.asarray(bindings[name], dtype=self.arg_dtypes[name])
+            if a.shape != tuple(shape):
+                raise ValueError(
+                    f'{name} has shape {a.shape}, expected {tuple(shape)}'
+                )
+            flat[name] = a.reshape(a.shape[:a.ndim - len(self.grid_shape)]
+                                   + (num_points,))
+        flat_out = out.reshape(-1, num_points)
+
+        dtypes = {'reg': self.dtype, 'reg64': np.float64}
+        buffers = {
+            pool: [
+                np.empty(self.chunk_size, dtype=dtypes[pool])
+                for _ in range(num)
+            ]
+            for pool, num in self.num_registers.items()
+        }
+        for start in range(0, num_points, self.chunk_size):
+            stop = min(start + self.chunk_size, num_points)
+            regs = {
+                pool: [b[:stop - start] for b in bufs]
+                for pool, bufs in buffers.items()
+            }
+
+            def fetch(spec):
+                if spec[0] in regs:
+                    return regs[spec[0]][spec[1]]
+                if spec[0] == 'out':
+                    return flat_out[spec[1], start:stop]
+                if spec[0] == 'const':
+                    return spec[1]
+                _, name, idx = spec
+                if idx is None:
+                    return flat[name][start:stop]
+                return flat[name][idx, start:stop]
+
+            for op, args, dest in self.program:
+                dest = fetch(dest)
+                args = [fetch(a) for a in args]
+                # float64 destinations compute in float64 even from float32
+                # operands; others take the loop of their operands, so that
+                # exp of a float64 argument is rounded only when stored
+                dtype = np.float64 if dest.dtype == np.float64 else None
+                if op is None:
+                    np.copyto(dest, args[0])
+                elif len(args) == 1:
+                    op(args[0], out=dest, dtype=dtype)
+                else:
+                    op(args[0], args[1], out=dest, dtype=dtype)
+                    for a in args[2:]:
+                        op(dest, a, out=dest, dtype=dtype)
+        return out
+
+# }}}
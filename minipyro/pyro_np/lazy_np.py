@@ -1,10 +1,8 @@
 import numpy as np
-import pycuda.gpuarray as gpuarray
 from minipyro.symbolic import (
     Variable, Expression, Call, Sum,
-    Product, Quotient, Subscript
+    Product, Quotient, Subscript, Stack, get_children
 )
-from minipyro.pyro_np.loopy import assemble_cuda
 
 
 # {{{
@@ -53,6 +51,15 @@ class LazyArray:
                 shape=self.shape
             )
 
+    def __truediv__(self, other):
+        if isinstance(other, LazyArray):
+            return broadcast_binary_op(self, other, Quotient)
+        else:
+            return ArrayExpression(
+                expr=Quotient(self, other),
+                shape=self.shape
+            )
+
     def __rtruediv__(self, other):
         if isinstance(other, LazyArray):
             return broadcast_binary_op(other, self, Quotient)
@@ -80,38 +87,163 @@ class ArrayExpression(LazyArray):
         self.expr = expr
         self.shape = shape
         self.cuda_prg = None
+        self.target = None
+
+    @property
+    def grid_shape(self):
+        # Stacked expressions carry one leading output axis per level of
+        # stacking, e.g. two for a Jacobian
+        ary, num_axes = self, 0
+        while isinstance(getattr(ary, 'expr', None), Stack):
+            ary = ary.expr.children[0]
+            num_axes += 1
+        return self.shape[num_axes:]
 
-    def compile(self, knl_name, wg_size):
-        self.wg_size = wg_size
-        self.cuda_prg, self.cuda_code = assemble_cuda(self, knl_name)
+    def get_cost(self, itemsize=8):
+        # Static operation and memory traffic counts per grid point
+        from minipyro.codegen.cost import get_array_cost
+        return get_array_cost(self, itemsize)
 
-    def evaluate(self, *np_data):
+    def compile(self, knl_name, wg_size=None, target='cuda', chunk_size=8192,
+                dtype='float64', mixed=False):
+        # target='c' builds a host kernel with the local C compiler and
+        # OpenMP, target='numpy' a chunked interpreter that needs no
+        # compiler. wg_size only applies to CUDA, chunk_size to 'numpy'.
+        # dtype='float32' stores arrays and computes in single precision;
+        # mixed=True with it computes exp and log arguments in float64.
+        if dtype not in ('float32', 'float64'):
+            raise ValueError(f'Unsupported dtype {dtype}')
+        if mixed and dtype != 'float32':
+            raise ValueError('mixed needs float32 storage')
+        self.target = target
+        self.dtype = np.dtype(dtype)
+        if target == 'cuda':
+            from minipyro.pyro_np.loopy import assemble_cuda
+            self.wg_size = wg_size
+            self.cuda_prg, self.cuda_code = assemble_cuda(
+                self, knl_name, dtype, mixed
+            )
+            # Of the kernel arguments, in name order like get_loopy_source
+            wide_args = get_call_arg_placeholders(self) if mixed else set()
+            self.arg_dtypes = [
+                np.dtype(np.float64) if name in wide_args else self.dtype
+                for name in sorted(list(get_placeholders(self)) + ['rxn_rate'])
+            ]
+        elif target == 'c':
+            if dtype != 'float64':
+                raise ValueError('The C target is float64 only')
+            from minipyro.pyro_np.host import assemble_host
+            self.host_prg, self.c_code = assemble_host(self, knl_name)
+        elif target == 'numpy':
+            from minipyro.pyro_np.interpreter import ChunkedInterpreter
+            self.host_prg = ChunkedInterpreter(self, chunk_size, dtype, mixed)
+        else:
+            raise ValueError(f'Unknown target {target}')
+
+    def evaluate(self, *np_data, out=None, **bindings):
+        # Host targets take placeholder values by name and return the
+        # output, allocated unless out is given
+        if self.target in ('c', 'numpy'):
+            return self.host_prg(out=out, **bindings)
+
+        import pycuda.gpuarray as gpuarray
         assert self.cuda_prg is not None
 
         ws = self.wg_size
-        dim = len(self.shape)
-        shape = self.shape + (1,) if dim == 2 else self.shape
-        print(shape)
+        dim = len(self.grid_shape)
+        shape = self.grid_shape + (1,) if dim == 2 else self.grid_shape
         grid = tuple(
             (s + ws - 1)//ws for s in shape
         )
         block = (ws, ws, 1) if dim == 2 else (ws, ws, ws)
 
-        dev_data = [gpuarray.to_gpu(a) for a in np_data]
-        self.cuda_prg(*dev_data, grid=grid, block=block)        
+        # Arrays in name order, then the grid extents
+        dev_data = [
+            gpuarray.to_gpu(np.ascontiguousarray(a, dtype=dtype))
+            for a, dtype in zip(np_data, self.arg_dtypes)
+        ]
+        extents = [np.int32(n) for n in self.grid_shape]
+        self.cuda_prg(*dev_data, *extents, grid=grid, block=block)
 
 
 def broadcast_binary_op(ary_1, ary_2, op: Expression):
 
     output_shape = np.broadcast_shapes(ary_1.shape, ary_2.shape)
     return ArrayExpression(
-        expr=op((ary_1, ary_2)),
+        expr=op(ary_1, ary_2) if op is Quotient else op((ary_1, ary_2)),
         shape=output_shape
     )
 
 # }}}
 
 
+# {{{ Graph helpers
+
+def get_array_children(ary: LazyArray):
+    # Subscripted placeholders are leaves, like placeholders themselves
+    if isinstance(ary.expr, Subscript):
+        return ()
+    return tuple(c for c in get_children(ary.expr) if isinstance(c, LazyArray))
+
+
+def count_uses(ary: LazyArray):
+    # LazyArrays hash by identity, so this counts uses in the graph as built
+    uses = {}
+    stack = [ary]
+    while stack:
+        for c in get_array_children(stack.pop()):
+            uses[c] = uses.get(c, 0) + 1
+            if uses[c] == 1:
+                stack.append(c)
+    return uses
+
+
+def get_placeholders(ary: LazyArray):
+    # Shapes of the placeholders the graph reads, sorted by name
+    shapes = {}
+    for node in [ary] + list(count_uses(ary)):
+        if isinstance(node, Placeholder):
+            shapes[node.name] = node.shape
+        elif isinstance(node.expr, Subscript):
+            shapes[node.expr.a.name] = node.expr.a.shape
+    return {name: shapes[name] for name in sorted(shapes)}
+
+
+def get_output_rows(ary: LazyArray):
+    # The expressions of the output's rows in C order, through nested
+    # stacks (a Jacobian is a stack of stacks)
+    outputs, stack = [], [ary]
+    while stack:
+        node = stack.pop()
+        if isinstance(getattr(node, 'expr', None), Stack):
+            stack.extend(reversed(node.expr.children))
+        else:
+            outputs.append(node)
+    return outputs
+
+
+def get_call_arg_placeholders(ary: LazyArray):
+    # Names of the placeholders read inside exp and log arguments, which
+    # mixed precision keeps in float64
+    names, seen = set(), set()
+    stack = [(ary, False)]
+    while stack:
+        node, in_call = stack.pop()
+        if (node, in_call) in seen:
+            continue
+        seen.add((node, in_call))
+        if isinstance(node, Placeholder) or isinstance(node.expr, Subscript):
+            if in_call:
+                names.add(node.name if isinstance(node, Placeholder)
+                          else node.expr.a.name)
+            continue
+        in_call = in_call or isinstance(node.expr, Call)
+        stack.extend((c, in_call) for c in get_array_children(node))
+    return names
+
+# }}}
+
+
 # {{{
 
 def exp(ary: LazyArray):
@@ -129,4 +261,12 @@ def log(ary: LazyArray):
         shape=ary.shape
     )
 
+
+def stack(arys):
+    shape = np.broadcast_shapes(*[a.shape for a in arys])
+    return ArrayExpression(
+        expr=Stack(tuple(arys)),
+        shape=(len(arys),) + shape
+    )
+
 # }}}
@@ -1,49 +1,129 @@
+import os
 import numpy as np
-import loopy as lp
 from mako.template import Template
-from pycuda.compiler import SourceModule
+from minipyro import cache
 from minipyro.codegen.mappers import LoopyMapper
+from minipyro.pyro_np.lazy_np import (
+    get_placeholders, get_call_arg_placeholders, get_output_rows
+)
 
 
 lp_tpl = Template(
     """
-rxn_rate[${idx_tuple}] = ${expr}
+%for out_idx, expr in outputs:
+rxn_rate[${out_idx}] = ${expr}
+%endfor
     """, strict_undefined=True)
 
 
-def assemble_cuda(ary, knl_name):
-    dim = len(ary.shape)
+# Compiled kernels of this process, by cache key
+_kernels = {}
+
+
+def get_loopy_source(ary, dtype='float64', mixed=False):
+    # Domain, argument and instruction text of the kernel. Together they
+    # are a structural serialization of the graph: LazyArrays hash by
+    # identity, but two graphs that print the same compute the same thing.
+    # Grid extents are the symbolic kernel arguments n0, n1, ..., so one
+    # kernel serves every grid size of a given expression.
+    dim = len(ary.grid_shape)
     idx_list = [f'i{i}' for i in range(dim)]
+    extents = [f'n{i}' for i in range(dim)]
 
     lp_domains = (
         '{[' + ', '.join(idx_list) + '] : ' +
         ' and '.join([
-            f'0 <= i{i} <= {n-1}' for i, n in zip(range(dim), ary.shape)
+            f'0 <= i{i} < n{i}' for i in range(dim)
         ]) + '}'
     )
 
-    lp_mapper = LoopyMapper()
-    idx_tuple = ', '.join(idx_list)
-    lp_instructions = lp_tpl.render(
-        idx_tuple=idx_tuple,
-        expr=lp_mapper.rec(ary)
-    )
+    # Placeholders and the output keep their leading axes, if any
+    arg_shapes = {
+        name: tuple(shape[:len(shape) - dim]) + tuple(extents)
+        for name, shape in get_placeholders(ary).items()
+    }
+    out_axes = tuple(ary.shape[:len(ary.shape) - dim])
+    arg_shapes['rxn_rate'] = out_axes + tuple(extents)
+    # With mixed, placeholders read by exp and log arguments stay float64
+    wide_args = get_call_arg_placeholders(ary) if mixed else set()
+    lp_args = [
+        (name, ', '.join(map(str, arg_shapes[name])),
+         'float64' if name in wide_args else dtype)
+        for name in sorted(arg_shapes)
+    ]
+
+    lp_mapper = LoopyMapper(dtype, mixed)
+    # One instruction per output row, indexed along the stacked axes
+    outputs = [
+        (', '.join([str(i) for i in np.unravel_index(k, out_axes)]
+                   + idx_list),
+         lp_mapper.rec(o))
+        for k, o in enumerate(get_output_rows(ary))
+    ]
+    return lp_domains, lp_args, lp_tpl.render(outputs=outputs)
 
+
+def generate_cuda_code(lp_domains, lp_args, lp_instructions, knl_name, dim,
+                       wg_size):
+    import loopy as lp
+
+    # Arrays in name order, then the grid extents
     lp_knl = lp.make_kernel(
-        lp_domains, lp_instructions, name=knl_name
+        lp_domains, lp_instructions,
+        [lp.GlobalArg(name, np.dtype(dtype), shape=shape)
+         for name, shape, dtype in lp_args]
+        + [lp.ValueArg(f'n{i}', np.int32) for i in range(dim)],
+        name=knl_name
     )
-    lp_knl = lp.add_dtypes(
-        lp_knl,
-        {a: np.float64 for a in lp_knl['get_rxn_rate'].arg_dict}
+    lp_knl = lp.assume(
+        lp_knl, ' and '.join([f'n{i} >= 1' for i in range(dim)])
     )
 
+    # Extents need not divide wg_size; loopy guards the partial work-groups
     for i in range(dim):
         lp_knl = lp.split_iname(
-            lp_knl, f'i{i}', ary.wg_size,
+            lp_knl, f'i{i}', wg_size,
             outer_tag=f'g.{i}', inner_tag=f'l.{i}'
         )
-                                
+
     lp_knl = lp_knl.copy(target=lp.CudaTarget())
-    code_str = lp.generate_code_v2(lp_knl).device_code()
+    return lp.generate_code_v2(lp_knl).device_code()
+
+
+def assemble_cuda(ary, knl_name, dtype='float64', mixed=False):
+    # Device code is cached in memory and on disk, so recompiling an
+    # unchanged expression (e.g. every time step, or in a fresh process)
+    # skips loopy altogether. pycuda caches the compiled binary itself.
+    from importlib.metadata import version
+    lp_domains, lp_args, lp_instructions = get_loopy_source(
+        ary, dtype, mixed
+    )
+    key = cache.content_hash(
+        lp_domains, lp_args, lp_instructions, knl_name, dtype, 'cuda',
+        ary.wg_size, version('loopy'), cache.get_version()
+    )
+    if key in _kernels:
+        return _kernels[key]
+
+    cache_dir = cache.get_cache_dir('cuda')
+    path = os.path.join(cache_dir, f'{key}.cu')
+    code_str = None
+    if cache.touch(path):
+        try:
+            with open(path) as fh:
+                code_str = fh.read()
+        except FileNotFoundError:
+            # Evicted between the check and the read
+            pass
+    if code_str is None:
+        code_str = generate_cuda_code(
+            lp_domains, lp_args, lp_instructions, knl_name,
+            len(ary.grid_shape), ary.wg_size
+        )
+        cache.atomic_write(path, code_str.encode())
+        cache.evict(cache_dir)
+
+    from pycuda.compiler import SourceModule
     prg = SourceModule(code_str).get_function(knl_name)
-    return prg, code_str
+    _kernels[key] = prg, code_str
+    return _kernels[key]
@@ -0,0 +1,277 @@
+import os
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# {{{ Chunk evaluation
+
+def evaluate_chunk(gas, has_out, buffers, method, out_axes, temperature,
+                   args, out, start, stop):
+    # temperature is (n,), each of args (num_species, n) and out (-1, n).
+    # Classes that take out= (in-place, C) write into a contiguous buffer
+    # of this worker, in their dtype, others allocate their (chunk-sized)
+    # result.
+    size = stop - start
+    chunk_args = [temperature[start:stop]] + [a[:, start:stop] for a in args]
+    if has_out:
+        key = (method, size)
+        if key not in buffers:
+            buffers[key] = np.empty(
+                out_axes + (size,), dtype=getattr(gas, 'dtype', np.float64)
+            )
+        result = getattr(gas, method)(*chunk_args, out=buffers[key])
+    else:
+        result = getattr(gas, method)(*chunk_args)
+    out[:, start:stop] = np.reshape(result, (-1, size))
+
+
+def takes_out(gas, method):
+    return 'out' in inspect.signature(getattr(gas, method)).parameters
+
+# }}}
+
+
+# {{{ Process workers
+
+def get_class_spec(cls):
+    # Generated classes are built at run time and cannot be pickled by
+    # reference, so workers rebuild them from their source or library
+    if getattr(cls, 'lib_path', None) is not None:
+        return 'native', {
+            name: getattr(cls, name) for name in (
+                'num_species', 'num_reactions', 'species_names', 'lib_path',
+                'c_code', 'costs'
+            )
+        }
+    source = getattr(cls, '_MODULE_SOURCE_CODE', None)
+    if source is None:
+        raise ValueError(
+            f'{cls.__name__} was not built by get_thermochem_class, and '
+            'cannot be rebuilt in worker processes'
+        )
+    return 'python', source
+
+
+def build_class(spec):
+    kind, data = spec
+    if kind == 'native':
+        from minipyro.codegen.c import NativeThermochemistry
+        return type('Thermochemistry', (NativeThermochemistry,), dict(data))
+    exec_dict = {}
+    exec(compile(data, '<generated code>', 'exec'), exec_dict)
+    return exec_dict['Thermochemistry']
+
+
+# Per-process state of pool workers
+_worker = {}
+
+
+def _init_worker(spec):
+    gas = build_class(spec)()
+    _worker.update(gas=gas, has_out={}, buffers={}, blocks={})
+
+
+def _attach(ref):
+    # ref is (shared memory name, byte offset, shape, dtype) of an array
+    name, offset, shape, dtype = ref
+    if name not in _worker['blocks']:
+        # Workers share the parent's resource tracker, for which attaching
+        # is a no-op; the parent unlinks the block on close()
+        _worker['blocks'][name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(
+        shape, dtype=dtype, buffer=_worker['blocks'][name].buf,
+        offset=offset
+    )
+
+
+def _run_shared_chunk(method, out_axes, refs, out_ref, start, stop):
+    gas = _worker['gas']
+    if method not in _worker['has_out']:
+        _worker['has_out'][method] = takes_out(gas, method)
+    temperature, *args = [_attach(r) for r in refs]
+    evaluate_chunk(
+        gas, _worker['has_out'][method], _worker['buffers'], method,
+        out_axes, temperature, args, _attach(out_ref), start, stop
+    )
+
+# }}}
+
+
+# {{{ Executor
+
+class ParallelThermochemistry:
+    # Evaluates a generated Thermochemistry class chunk by chunk over the
+    # flattened grid, on a pool of num_workers threads (NumPy and the C
+    # backend release the GIL) or processes. Processes read inputs from and
+    # write outputs to shared memory: arrays from self.empty are shared
+    # as they are, other arguments are copied through scratch blocks.
+    # Inputs are passed as float64, and each chunk cast by the class;
+    # outputs are of the class's dtype (float32 for single and mixed
+    # precision classes).
+
+    def __init__(self, thermochem_class, num_workers=None, chunk_size=8192,
+                 executor='thread'):
+        self.thermochem_class = thermochem_class
+        self.num_species = thermochem_class.num_species
+        self.num_reactions = thermochem_class.num_reactions
+        self.dtype = np.dtype(getattr(thermochem_class, 'dtype', np.float64))
+        self.num_workers = num_workers or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.executor = executor
+        if executor == 'thread':
+            self.pool = ThreadPoolExecutor(self.num_workers)
+            self.local = threading.local()
+        elif executor == 'process':
+            self.pool = ProcessPoolExecutor(
+                self.num_workers, initializer=_init_worker,
+                initargs=(get_class_spec(thermochem_class),)
+            )
+            # Shared memory blocks, with their base addresses
+            self.blocks = []
+            self.scratch = {}
+        else:
+            raise ValueError(f'Unknown executor {executor}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        if self.executor == 'process':
+            self.scratch = {}
+            for shm, _ in self.blocks:
+                try:
+                    shm.close()
+                except BufferError:
+                    # Arrays from empty() are still in use, and keep the
+                    # mapping alive until they are freed
+                    pass
+                shm.unlink()
+            self.blocks = []
+
+    def empty(self, shape, dtype=None):
+        # Output (or input) arrays that process workers use without copies,
+        # of the class's dtype unless given. They stay valid until close().
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        if self.executor != 'process':
+            return np.empty(shape, dtype=dtype)
+        nbytes = max(dtype.itemsize * int(np.prod(shape)), 1)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        ary = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        base = np.frombuffer(shm.buf, dtype=np.uint8).ctypes.data
+        self.blocks.append((shm, base))
+        return ary
+
+    def share(self, ary, role, copy):
+        # Reference to ary in shared memory, through a scratch block kept
+        # per role when ary is not already in one of our blocks. Scratch
+        # blocks only grow, so that workers map few of them.
+        addr = ary.ctypes.data
+        if ary.flags.c_contiguous:
+            for shm, base in self.blocks:
+                if base <= addr and addr + ary.nbytes <= base + shm.size:
+                    ref = (shm.name, addr - base, ary.shape, ary.dtype.str)
+                    return ref, ary
+        if (role not in self.scratch or self.scratch[role].size < ary.size
+                or self.scratch[role].dtype != ary.dtype):
+            self.scratch[role] = self.empty(ary.size, ary.dtype)
+        shared = self.scratch[role][:ary.size].reshape(ary.shape)
+        if copy:
+            np.copyto(shared, ary)
+        return self.share(shared, role, copy=False)
+
+    def get_worker_state(self, method):
+        # Thread workers each own an instance, since in-place classes keep
+        # their workspaces on it
+        local = self.local
+        if not hasattr(local, 'gas'):
+            local.gas = self.thermochem_class()
+            local.has_out = {}
+            local.buffers = {}
+        if method not in local.has_out:
+            local.has_out[method] = takes_out(local.gas, method)
+        return local.gas, local.has_out[method], local.buffers
+
+    def evaluate(self, method, out_axes, temperature, *args, out=None):
+        temperature = np.asarray(temperature, dtype=np.float64)
+        grid_shape = temperature.shape
+        num_points = temperature.size
+        args = [np.asarray(a, dtype=np.float64) for a in args]
+        for a in args:
+            if a.shape != (self.num_species,) + grid_shape:
+                raise ValueError(
+                    f'concentration has shape {a.shape}, expected '
+                    f'{(self.num_species,) + grid_shape}'
+                )
+        out_shape = out_axes + grid_shape
+        if out is None:
+            out = self.empty(out_shape)
+        elif (out.shape != out_shape or out.dtype != self.dtype
+              or not out.flags.c_contiguous):
+            raise ValueError(
+                f'out must be a C-contiguous {self.dtype} array of shape '
+                f'{out_shape}'
+            )
+
+        temperature = temperature.reshape(num_points)
+        args = [a.reshape(self.num_species, num_points) for a in args]
+        chunks = [
+            (start, min(start + self.chunk_size, num_points))
+            for start in range(0, num_points, self.chunk_size)
+        ]
+
+        if self.executor == 'thread':
+            flat_out = out.reshape(-1, num_points)
+
+            def run(chunk):
+                gas, has_out, buffers = self.get_worker_state(method)
+                evaluate_chunk(gas, has_out, buffers, method, out_axes,
+                               temperature, args, flat_out, *chunk)
+            # list() waits for every chunk and re-raises the first error
+            list(self.pool.map(run, chunks))
+            return out
+
+        refs = [self.share(temperature, 'temperature', copy=True)[0]]
+        refs += [
+            self.share(a, f'arg{k}', copy=True)[0] for k, a in enumerate(args)
+        ]
+        out_ref, shared_out = self.share(
+            out.reshape(-1, num_points), 'out', copy=False
+        )
+        futures = [
+            self.pool.submit(_run_shared_chunk, method, out_axes, refs,
+                             out_ref, start, stop)
+            for start, stop in chunks
+        ]
+        for f in futures:
+            f.result()
+        if not np.shares_memory(shared_out, out):
+            np.copyto(out.reshape(-1, num_points), shared_out)
+        return out
+
+    def get_fwd_rate_coefficients(self, temperature, out=None):
+        return self.evaluate(
+            'get_fwd_rate_coefficients', (self.num_reactions,), temperature,
+            out=out
+        )
+
+    def get_rxn_rate(self, temperature, concentration, out=None):
+        return self.evaluate(
+            'get_rxn_rate', (self.num_reactions,), temperature, concentration,
+            out=out
+        )
+
+    def get_rxn_rate_jacobian(self, temperature, concentration, out=None):
+        return self.evaluate(
+            'get_rxn_rate_jacobian',
+            (self.num_reactions, self.num_species + 1), temperature,
+            concentration, out=out
+        )
+
+# }}}
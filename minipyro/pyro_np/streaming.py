@@ -0,0 +1,224 @@
+import os
+import json
+import mmap
+import hashlib
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from minipyro import cache
+
+
+# {{{ Files
+
+def open_input(path, shape=None, dtype=np.float64, offset=0):
+    # .npy files carry their shape, raw binary files need it given.
+    # Species concentrations are (num_species, *grid), as everywhere else.
+    if str(path).endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def release_pages(ary, start, stop):
+    # Drops the mapped pages of ary[..., start:stop] from this process, so
+    # that resident memory does not grow with the part already streamed.
+    # Written pages must have been flushed first. ary is the np.memmap
+    # itself, C-contiguous with the grid flattened to its last axis.
+    mm = getattr(ary, '_mmap', None)
+    if mm is None or not hasattr(mm, 'madvise'):
+        return
+    # The mapping starts at the offset rounded down to the granularity
+    data_start = ary.offset % mmap.ALLOCATIONGRANULARITY
+    num_points = ary.shape[-1]
+    page = mmap.PAGESIZE
+    for row in range(ary.size // num_points):
+        first = data_start + (row * num_points + start) * ary.itemsize
+        last = data_start + (row * num_points + stop) * ary.itemsize
+        # Pages shared with the neighbouring chunks go too; they are
+        # clean, and simply read in again if touched
+        first = first // page * page
+        last = min(-(-last // page) * page, len(mm))
+        if last > first:
+            mm.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+
+def get_input_fingerprint(ary):
+    # Memory-mapped files by path, size and modification time, arrays in
+    # memory by content
+    path = getattr(ary, 'filename', None)
+    if path is not None:
+        st = os.stat(path)
+        return {
+            'path': os.path.abspath(path), 'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns, 'offset': getattr(ary, 'offset', 0),
+        }
+    return {
+        'sha256': hashlib.sha256(np.ascontiguousarray(ary)).hexdigest(),
+    }
+
+
+def get_class_fingerprint(cls):
+    # Generated source, or C source and library, of the class
+    for name in ['_MODULE_SOURCE_CODE', 'c_code', 'lib_path']:
+        source = getattr(cls, name, None)
+        if source is not None:
+            return cache.content_hash(name, source)
+    return f'{cls.__module__}.{cls.__qualname__}'
+
+# }}}
+
+
+# {{{ Driver
+
+class StreamingDriver:
+    # Runs a generated Thermochemistry class over memory-mapped snapshots
+    # chunk by chunk, writing to a memory-mapped .npy output. The next
+    # chunk is read in on a background thread while the current one is
+    # computed, and pages are released as chunks complete, so that
+    # resident memory stays bounded by a few chunks. After every chunk the
+    # output is flushed and the progress recorded next to it, from which
+    # an interrupted run resumes: with the same parameters, inputs and
+    # class only, and from scratch otherwise.
+
+    def __init__(self, thermochem_class, chunk_size=16384, prefetch=True):
+        self.thermochem_class = thermochem_class
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+
+    @staticmethod
+    def get_progress_path(out_path):
+        return str(out_path) + '.progress'
+
+    def get_out_axes(self, method):
+        num_rxns = self.thermochem_class.num_reactions
+        if method == 'get_rxn_rate_jacobian':
+            return (num_rxns, self.thermochem_class.num_species + 1)
+        return (num_rxns,)
+
+    def open_outputs(self, paths, shapes, state, resume):
+        # Resumes only from a run with the same parameters and outputs
+        progress_path = self.get_progress_path(paths[0])
+        if resume and os.path.exists(progress_path):
+            with open(progress_path) as fh:
+                progress = json.load(fh)
+            if ({k: v for k, v in progress.items() if k != 'completed'}
+                    == state and all(os.path.exists(p) for p in paths)):
+                outs = [np.load(p, mmap_mode='r+') for p in paths]
+                return outs, progress['completed']
+        outs = [
+            np.lib.format.open_memmap(p, mode='w+', shape=s)
+            for p, s in zip(paths, shapes)
+        ]
+        self.save_progress(progress_path, state, 0)
+        return outs, 0
+
+    @staticmethod
+    def save_progress(path, state, completed):
+        cache.atomic_write(
+            path, json.dumps(dict(state, completed=completed)).encode()
+        )
+
+    def run(self, temperature, concentration, out_path,
+            method='get_rxn_rate', grad_path=None, resume=True,
+            callback=None):
+        # temperature is (num_points,) and concentration (num_species,
+        # num_points), e.g. from open_input. With grad_path, adiff_np also
+        # writes (1 + num_species, num_points) sensitivities there: row 0
+        # is d(sum of rxn_rate)/d(temperature), row k + 1 the same for
+        # concentration[k]. callback(chunk, num_chunks) runs after each
+        # chunk is committed. Returns the output arrays.
+        num_species = self.thermochem_class.num_species
+        num_points = temperature.shape[-1]
+        if temperature.shape != (num_points,):
+            raise ValueError('temperature must be flat, (num_points,)')
+        if concentration.shape != (num_species, num_points):
+            raise ValueError(
+                f'concentration has shape {concentration.shape}, expected '
+                f'{(num_species, num_points)}'
+            )
+        if grad_path is not None and method != 'get_rxn_rate':
+            raise ValueError('Sensitivities are of get_rxn_rate only')
+        if (grad_path is not None and 'pyro_np' not in
+                inspect.signature(self.thermochem_class).parameters):
+            raise ValueError(
+                'Sensitivities need a class that takes pyro_np, not an '
+                'in-place or native one'
+            )
+
+        paths = [out_path]
+        shapes = [self.get_out_axes(method) + (num_points,)]
+        if grad_path is not None:
+            paths.append(grad_path)
+            shapes.append((1 + num_species, num_points))
+        state = {
+            'method': method, 'num_points': num_points,
+            'chunk_size': self.chunk_size, 'outputs': list(map(str, paths)),
+            'temperature': get_input_fingerprint(temperature),
+            'concentration': get_input_fingerprint(concentration),
+            'class': get_class_fingerprint(self.thermochem_class),
+        }
+        outs, completed = self.open_outputs(paths, shapes, state, resume)
+        flat_outs = [o.reshape(-1, num_points) for o in outs]
+
+        chunks = [
+            (start, min(start + self.chunk_size, num_points))
+            for start in range(0, num_points, self.chunk_size)
+        ]
+        if completed >= len(chunks):
+            return outs
+
+        if grad_path is None:
+            gas = self.thermochem_class()
+        else:
+            from minipyro.pyro_np import adiff_np
+            gas = self.thermochem_class(adiff_np)
+
+        def read(chunk):
+            # Copied into memory, after which the mapped pages can go
+            start, stop = chunk
+            temp = np.array(temperature[start:stop])
+            conc = np.array(concentration[:, start:stop])
+            release_pages(temperature, start, stop)
+            release_pages(concentration, start, stop)
+            return temp, conc
+
+        progress_path = self.get_progress_path(out_path)
+        with ThreadPoolExecutor(1) as pool:
+            next_chunk = pool.submit(read, chunks[completed])
+            for k in range(completed, len(chunks)):
+                start, stop = chunks[k]
+                temp, conc = next_chunk.result()
+                if self.prefetch and k + 1 < len(chunks):
+                    next_chunk = pool.submit(read, chunks[k + 1])
+
+                if grad_path is None:
+                    results = [getattr(gas, method)(temp, conc)]
+                else:
+                    results = self.get_sensitivities(gas, temp, conc)
+                for flat_out, result in zip(flat_outs, results):
+                    flat_out[:, start:stop] = np.reshape(
+                        result, (-1, stop - start)
+                    )
+
+                for o in outs:
+                    o.flush()
+                    release_pages(o, start, stop)
+                self.save_progress(progress_path, state, k + 1)
+                if callback is not None:
+                    callback(k, len(chunks))
+                if not self.prefetch and k + 1 < len(chunks):
+                    next_chunk = pool.submit(read, chunks[k + 1])
+        return outs
+
+    @staticmethod
+    def get_sensitivities(gas, temp, conc):
+        from minipyro.pyro_np import adiff_np
+        rxn_rate = gas.get_rxn_rate(
+            adiff_np.AutodiffVariable(temp, name='temperature'),
+            adiff_np.AutodiffVariable(conc, name='concentration')
+        )
+        grads = rxn_rate.gradient()
+        return rxn_rate.values, np.concatenate([
+            grads['temperature'][None], grads['concentration']
+        ])
+
+# }}}
@@ -1,9 +1,113 @@
+import math
+import numbers
+from contextlib import contextmanager
 
 
-class Expression:
+# {{{ Interning
+
+_intern_table = None
+
+
+class ExpressionMeta(type):
+
+    def __call__(cls, *args):
+        expr = super().__call__(*args)
+        if _intern_table is None:
+            return expr
+        return _intern_table.setdefault(expr, expr)
+
+
+@contextmanager
+def interned(table=None):
+    # Structurally identical nodes built inside this context are the same
+    # object. Passing a table shares it across several contexts.
+    global _intern_table
+    prev_table = _intern_table
+    _intern_table = {} if table is None else table
+    try:
+        yield _intern_table
+    finally:
+        _intern_table = prev_table
+
+
+def _tag(c):
+    # Tell apart numbers that compare equal but print differently, e.g. 1
+    # and 1.0, which matters for integer division in Fortran
+    if isinstance(c, Expression):
+        return c
+    if type(c) is tuple:
+        return tuple(map(_tag, c))
+    if isinstance(c, numbers.Number):
+        return (type(c), c)
+    return c
+
+# }}}
+
+
+# {{{ Expressions
+
+class Expression(metaclass=ExpressionMeta):
+    __slots__ = ('_hash',)
 
     def __init__(self, children):
-        self.children = children
+        object.__setattr__(self, 'children', children)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __getinitargs__(self):
+        return (self.children,)
+
+    def __reduce__(self):
+        return (type(self), self.__getinitargs__())
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            # Hash unhashed descendants first, so deep trees never recurse
+            stack = [self]
+            while stack:
+                expr = stack[-1]
+                pending = [
+                    c for c in get_children(expr)
+                    if isinstance(c, Expression) and not hasattr(c, '_hash')
+                ]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                stack.pop()
+                object.__setattr__(
+                    expr, '_hash', hash((type(expr), expr.__getinitargs__()))
+                )
+            return self._hash
+
+    def __eq__(self, other):
+        # Pairs of nodes go on an explicit stack, so that comparing deep
+        # trees never recurses; shared nodes and differing hashes end the
+        # comparison of a pair early
+        stack = [(self, other)]
+        while stack:
+            a, b = stack.pop()
+            if a is b:
+                continue
+            if isinstance(a, Expression):
+                if type(a) is not type(b) or hash(a) != hash(b):
+                    return False
+                a, b = a.__getinitargs__(), b.__getinitargs__()
+            if type(a) is tuple:
+                if type(b) is not tuple or len(a) != len(b):
+                    return False
+                stack.extend(zip(a, b))
+            elif isinstance(b, Expression) or _tag(a) != _tag(b):
+                return False
+        return True
+
+    def __repr__(self):
+        return '{:s}({:s})'.format(
+            type(self).__name__,
+            ', '.join(repr(a) for a in self.__getinitargs__())
+        )
 
     def __add__(self, other):
         return Sum((self, other))
@@ -31,13 +135,18 @@ class Expression:
 
 
 class Variable(Expression):
+    __slots__ = ('name',)
     mapper_method = 'map_variable'
 
     def __init__(self, name):
-        self.name = name
+        object.__setattr__(self, 'name', name)
+
+    def __getinitargs__(self):
+        return (self.name,)
 
 
 class Sum(Expression):
+    __slots__ = ('children',)
     mapper_method = 'map_sum'
 
     def __add__(self, other):
@@ -47,6 +156,7 @@ class Sum(Expression):
 
 
 class Product(Expression):
+    __slots__ = ('children',)
     mapper_method = 'map_product'
 
     def __mul__(self, other):
@@ -56,24 +166,218 @@ class Product(Expression):
 
 
 class Quotient(Expression):
+    __slots__ = ('num', 'den')
     mapper_method = 'map_quotient'
 
     def __init__(self, num, den):
-        self.num = num
-        self.den = den
+        object.__setattr__(self, 'num', num)
+        object.__setattr__(self, 'den', den)
+
+    def __getinitargs__(self):
+        return (self.num, self.den)
 
 
 class Call(Expression):
+    __slots__ = ('fn_name', 'fn_arg')
     mapper_method = 'map_call'
 
     def __init__(self, fn_name, fn_arg):
-        self.fn_name = fn_name
-        self.fn_arg = fn_arg
+        object.__setattr__(self, 'fn_name', fn_name)
+        object.__setattr__(self, 'fn_arg', fn_arg)
+
+    def __getinitargs__(self):
+        return (self.fn_name, self.fn_arg)
 
 
 class Subscript(Expression):
+    __slots__ = ('a', 'i')
     mapper_method = 'map_subscript'
 
     def __init__(self, ary, idx):
-        self.a = ary
-        self.i = idx
+        object.__setattr__(self, 'a', ary)
+        object.__setattr__(self, 'i', idx)
+
+    def __getinitargs__(self):
+        return (self.a, self.i)
+
+
+class Stack(Expression):
+    __slots__ = ('children',)
+    mapper_method = 'map_stack'
+
+# }}}
+
+
+# {{{ Traversal helpers
+
+def get_children(expr):
+    if isinstance(expr, (Sum, Product, Stack)):
+        return expr.children
+    if isinstance(expr, Quotient):
+        return (expr.num, expr.den)
+    if isinstance(expr, Call):
+        return (expr.fn_arg,)
+    if isinstance(expr, Subscript):
+        return (expr.a,)
+    return ()
+
+
+def rebuild(expr, children):
+    if isinstance(expr, Sum):
+        return Sum(tuple(children))
+    if isinstance(expr, Product):
+        return Product(tuple(children))
+    if isinstance(expr, Stack):
+        return Stack(tuple(children))
+    if isinstance(expr, Quotient):
+        return Quotient(*children)
+    if isinstance(expr, Call):
+        return Call(expr.fn_name, children[0])
+    if isinstance(expr, Subscript):
+        return Subscript(children[0], expr.i)
+    return expr
+
+
+def walk(exprs):
+    # Every occurrence in the expression trees, as the mappers visit them
+    stack = list(exprs)
+    while stack:
+        expr = stack.pop()
+        yield expr
+        stack.extend(get_children(expr))
+
+# }}}
+
+
+# {{{ Simplification
+
+# Integer powers up to this exponent are expanded into multiplies
+MAX_EXPANDED_POWER = 4
+
+_folded_calls = {'exp': math.exp, 'log': math.log}
+
+
+def _is_const(expr, value):
+    return isinstance(expr, numbers.Number) and expr == value
+
+
+def _fn_name(expr):
+    return getattr(expr.fn_name, 'name', expr.fn_name)
+
+
+def _simplify_sum(expr):
+    # Flatten nested sums, merge numbers into one leading constant
+    terms, const = [], 0
+    for c in expr.children:
+        for t in (c.children if isinstance(c, Sum) else (c,)):
+            if isinstance(t, numbers.Number):
+                const += t
+            else:
+                terms.append(t)
+    if const != 0 or not terms:
+        terms.insert(0, const)
+    return terms[0] if len(terms) == 1 else Sum(tuple(terms))
+
+
+def _simplify_product(expr):
+    # Flatten nested products, merge numbers into one leading factor
+    factors, const = [], 1
+    for c in expr.children:
+        for f in (c.children if isinstance(c, Product) else (c,)):
+            if isinstance(f, numbers.Number):
+                const *= f
+            else:
+                factors.append(f)
+    if const == 0:
+        return 0
+    if const != 1 or not factors:
+        factors.insert(0, const)
+    return factors[0] if len(factors) == 1 else Product(tuple(factors))
+
+
+def _simplify_quotient(expr):
+    num, den = expr.num, expr.den
+    if _is_const(den, 0):
+        # Division by zero is left for evaluation to report
+        return expr
+    if _is_const(num, 0):
+        return 0
+    if isinstance(den, numbers.Number):
+        if isinstance(num, numbers.Number):
+            return num / den
+        return _simplify_product(Product((1 / den, num)))
+    return expr
+
+
+def _expand_power_law(expr):
+    # exp(c + b * log(x)) -> exp(c) * x * ... * x for small integer b,
+    # i.e. pure Arrhenius rates A T^b, which then need no exp or log
+    arg = expr.fn_arg
+    const, base, b = 0, None, None
+    for t in (arg.children if isinstance(arg, Sum) else (arg,)):
+        if isinstance(t, numbers.Number):
+            const += t
+            continue
+        coeff = 1
+        if (isinstance(t, Product) and len(t.children) == 2
+                and isinstance(t.children[0], numbers.Number)):
+            coeff, t = t.children
+        if base is not None or not (isinstance(t, Call)
+                                    and _fn_name(t) == 'log'):
+            return expr
+        base, b = t.fn_arg, coeff
+    if (base is None or not float(b).is_integer()
+            or abs(b) > MAX_EXPANDED_POWER):
+        return expr
+
+    factors = (base,) * abs(int(b))
+    if b >= 0:
+        return _simplify_product(Product((math.exp(const),) + factors))
+    return Quotient(
+        math.exp(const), factors[0] if len(factors) == 1 else Product(factors)
+    )
+
+
+def _simplify_call(expr):
+    fn_name = _fn_name(expr)
+    if isinstance(expr.fn_arg, numbers.Number) and fn_name in _folded_calls:
+        return _folded_calls[fn_name](expr.fn_arg)
+    if fn_name == 'exp':
+        return _expand_power_law(expr)
+    return expr
+
+
+_simplifiers = {
+    Sum: _simplify_sum, Product: _simplify_product,
+    Quotient: _simplify_quotient, Call: _simplify_call
+}
+
+
+def simplify(exprs):
+    # Bottom-up algebraic simplification: drops zero terms and unit
+    # factors, folds constants and expands small integer powers. Shared
+    # subtrees are simplified once, with an explicit stack.
+    memo = {}
+    stack = [e for e in exprs if isinstance(e, Expression)]
+    while stack:
+        expr = stack[-1]
+        if expr in memo:
+            stack.pop()
+            continue
+        pending = [
+            c for c in get_children(expr)
+            if isinstance(c, Expression) and c not in memo
+        ]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        new_expr = rebuild(expr, [
+            memo[c] if isinstance(c, Expression) else c
+            for c in get_children(expr)
+        ])
+        simplifier = _simplifiers.get(type(new_expr))
+        memo[expr] = new_expr if simplifier is None else simplifier(new_expr)
+    return [memo[e] if isinstance(e, Expression) else e for e in exprs]
+
+# }}}